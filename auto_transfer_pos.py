@@ -6,18 +6,18 @@ import paramiko
 from scp import SCPClient
 
 # Configuration
-LOCAL_FILE = r"D:\PROJECTS\ParkEase-Python-Backend\src\parkease"  # File to monitor
+LOCAL_FILE = r"D:\PROJECTS\ParkEase-Python-Backend\src\parkease.layout"  # File to monitor
 EC2_HOST = "ec2-54-235-129-4.compute-1.amazonaws.com"  # EC2 instance public DNS
 EC2_USER = "ubuntu"  # EC2 username
 PEM_KEY_PATH = r"C:\Users\arjun\Downloads\parkease-test-free-key.pem"  # Private key path
 REMOTE_DIRECTORY = "/home/ubuntu/parkease-final/src/"  # Directory on EC2
 
-# SCP Helper
-def create_scp_client():
+# SSH Helper
+def create_ssh_client():
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     ssh.connect(EC2_HOST, username=EC2_USER, key_filename=PEM_KEY_PATH)
-    return SCPClient(ssh.get_transport())
+    return ssh
 
 # Event Handler
 class FileHandler(FileSystemEventHandler):
@@ -32,13 +32,24 @@ class FileHandler(FileSystemEventHandler):
     def on_created(self, event):
         self.on_modified(event)  # Handle file creation the same way
 
+    def on_moved(self, event):
+        # SlotLayout.save writes a temp file and renames it over the layout
+        if event.dest_path == LOCAL_FILE:
+            self.transfer_file(event.dest_path)
+
     def transfer_file(self, file_path):
         try:
-            with create_scp_client() as scp:
+            ssh = create_ssh_client()
+            with SCPClient(ssh.get_transport()) as scp:
                 # Specify the exact destination path for the file
-                remote_file_path = os.path.join(REMOTE_DIRECTORY, "parkease")
-                scp.put(file_path, remote_file_path)
-                print(f"Transferred {file_path} to EC2:{remote_file_path}")
+                remote_file_path = os.path.join(REMOTE_DIRECTORY, "parkease.layout")
+                # Upload beside it and rename, so the detector's hot reload never sees a partial file
+                scp.put(file_path, remote_file_path + ".tmp")
+            _, stdout, _ = ssh.exec_command(f"mv -f '{remote_file_path}.tmp' '{remote_file_path}'")
+            if stdout.channel.recv_exit_status() != 0:
+                raise RuntimeError("rename on EC2 failed")
+            ssh.close()
+            print(f"Transferred {file_path} to EC2:{remote_file_path}")
         except Exception as e:
             print(f"Error during file transfer: {e}")
 
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import math
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Upper bound on how long a long-poll read may wait for a newer version
+LONG_POLL_MAX_TIMEOUT = float(os.getenv("LONG_POLL_MAX_TIMEOUT", 30))  # seconds
+EARTH_RADIUS_KM = 6371.0
+JSON_STATUS = {True: "true", False: "false", None: "null"}
+
+
+class LotInfo:
+    def __init__(self, lot_id: str, name: str = None, location: str = None,
+                 latitude: float = None, longitude: float = None):
+        self.lot_id = lot_id
+        self.name = name
+        self.location = location
+        self.latitude = latitude
+        self.longitude = longitude
+        # Provisioned slot number -> (lat, long); empty when only detectors know the lot
+        self.slots: Dict[str, Tuple[Optional[float], Optional[float]]] = {}
+
+    def coordinates(self) -> Optional[Tuple[float, float]]:
+        if self.latitude is not None and self.longitude is not None:
+            return self.latitude, self.longitude
+        # Lots created without coordinates: the centre of their slots
+        points = [point for point in self.slots.values() if None not in point]
+        if not points:
+            return None
+        return sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)
+
+
+class LotStates:
+    """Slot states of one lot kept ready to serve.
+
+    Holds the free/occupied counts and each slot's JSON fragment, so a
+    commit of a few slots updates them in place and a read after it only
+    joins the fragments instead of rebuilding and re-encoding the lot.
+    """
+
+    def __init__(self, states: Dict[str, Optional[bool]]):
+        self.states = dict(states)
+        self.index = {slot_number: i for i, slot_number in enumerate(self.states)}
+        self.parts = [f"{json.dumps(n)}: {JSON_STATUS[status]}" for n, status in self.states.items()]
+        statuses = list(self.states.values())
+        self.free = statuses.count(True)
+        self.occupied = statuses.count(False)
+
+    def set(self, slot_number: str, status: Optional[bool]):
+        if slot_number in self.states:
+            previous = self.states[slot_number]
+            self.free -= previous is True
+            self.occupied -= previous is False
+        else:
+            self.index[slot_number] = len(self.parts)
+            self.parts.append("")
+        self.states[slot_number] = status
+        self.free += status is True
+        self.occupied += status is False
+        self.parts[self.index[slot_number]] = f"{json.dumps(slot_number)}: {JSON_STATUS[status]}"
+
+    def summary(self) -> Tuple[int, int, int]:
+        return len(self.states), self.free, self.occupied
+
+    def json(self) -> str:
+        # Same text as json.dumps(self.states)
+        return "{" + ", ".join(self.parts) + "}"
+
+
+class AvailabilityView:
+    """Read side of lot occupancy, answered from memory.
+
+    Slot states come from `state` (the write-behind buffer's latest states),
+    lot and slot metadata from the DB at startup and from the setup
+    endpoints. Every commit of changed slots bumps the lot's version, wakes
+    long-poll readers and drops the lot's cached response bodies, which are
+    otherwise serialized once per version.
+    """
+
+    def __init__(self, state: Callable[[str], Dict[str, bool]]):
+        self.state = state
+        self.lots: Dict[str, LotInfo] = {}
+        self.versions: Dict[str, int] = {}
+        # Persisted statuses, until a detector reports the slot
+        self.stored: Dict[str, Dict[str, bool]] = {}
+        self._revision = 0
+        self._events: Dict[str, asyncio.Event] = {}
+        self._bodies: Dict[Tuple[str, bool], Tuple[str, bytes]] = {}
+        # Built on first read, updated in place by commit, rebuilt after metadata changes
+        self._states: Dict[str, LotStates] = {}
+        # Lot coordinates, which may average every slot, until metadata changes
+        self._coordinates: Dict[str, Optional[Tuple[float, float]]] = {}
+        self._points = None
+
+        self.reads = 0
+        self.renders = 0
+        self.long_polls = 0
+
+    async def warm(self, prisma):
+        self.lots.clear()
+        self.stored.clear()
+        for lot in await prisma.parkinglot.find_many():
+            self.set_lot(lot.id, lot.name, lot.location,
+                         getattr(lot, "latitude", None), getattr(lot, "longitude", None))
+        for slot in await prisma.parkingslot.find_many():
+            self.add_slot(slot.lotId, slot.slotNumber, slot.locationX, slot.locationY, slot.status)
+        self._changed()
+
+    def set_lot(self, lot_id: str, name: str = None, location: str = None,
+                latitude: float = None, longitude: float = None):
+        lot = self.lots.setdefault(lot_id, LotInfo(lot_id))
+        lot.name = name if name is not None else lot.name
+        lot.location = location if location is not None else lot.location
+        lot.latitude = latitude if latitude is not None else lot.latitude
+        lot.longitude = longitude if longitude is not None else lot.longitude
+        self._changed(lot_id)
+
+    def add_slot(self, lot_id: str, slot_number: int, latitude: float = None, longitude: float = None,
+                 status: bool = None):
+        # status is the slot's persisted status, e.g. as provisioned
+        self.lots.setdefault(lot_id, LotInfo(lot_id)).slots[str(slot_number)] = (latitude, longitude)
+        if status is not None:
+            self.stored.setdefault(lot_id, {})[str(slot_number)] = bool(status)
+        self._changed(lot_id)
+
+    def _changed(self, lot_id: str = None):
+        # Metadata changed: the ETag carries a revision so cached copies go stale
+        self._revision += 1
+        self._points = None
+        if lot_id is None:
+            self._bodies.clear()
+            self._states.clear()
+            self._coordinates.clear()
+        else:
+            self._drop(lot_id)
+            self._states.pop(lot_id, None)
+            self._coordinates.pop(lot_id, None)
+
+    def _drop(self, lot_id: str):
+        self._bodies.pop((lot_id, True), None)
+        self._bodies.pop((lot_id, False), None)
+
+    def version(self, lot_id: str) -> int:
+        return self.versions.get(lot_id, 0)
+
+    def commit(self, lot_id: str, changed: Dict[str, bool]) -> int:
+        # Called by the ingest path after staging; returns the lot's version
+        if not changed:
+            return self.version(lot_id)
+        self.versions[lot_id] = self.version(lot_id) + 1
+        self._drop(lot_id)
+        states = self._states.get(lot_id)
+        if states is not None:
+            for slot_number, status in changed.items():
+                states.set(slot_number, status)
+        event = self._events.pop(lot_id, None)
+        if event is not None:
+            event.set()
+        return self.versions[lot_id]
+
+    async def wait(self, lot_id: str, since: int, timeout: float) -> bool:
+        # True once the lot's version is past `since`, False on timeout
+        if self.version(lot_id) > since:
+            return True
+        self.long_polls += 1
+        event = self._events.setdefault(lot_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), min(timeout, LONG_POLL_MAX_TIMEOUT))
+        except asyncio.TimeoutError:
+            return False
+        return self.version(lot_id) > since
+
+    def known(self, lot_id: str) -> bool:
+        return lot_id in self.lots or lot_id in self.versions
+
+    def etag(self, lot_id: str) -> str:
+        return f'"{lot_id}-{self.version(lot_id)}-{self._revision}"'
+
+    def slot_states(self, lot_id: str) -> Dict[str, Optional[bool]]:
+        return dict(self._lot_states(lot_id).states)
+
+    def _lot_states(self, lot_id: str) -> LotStates:
+        states = self._states.get(lot_id)
+        if states is None:
+            states = self._states[lot_id] = LotStates(self._collect(lot_id))
+        return states
+
+    def _collect(self, lot_id: str) -> Dict[str, Optional[bool]]:
+        # Provisioned slots first (None until any status is known), then any
+        # extra slots a detector reports
+        latest = self.state(lot_id)
+        stored = self.stored.get(lot_id, {})
+        lot = self.lots.get(lot_id)
+        slots = {n: latest.get(n, stored.get(n)) for n in (lot.slots if lot else ())}
+        for slot_number, status in latest.items():
+            slots.setdefault(slot_number, status)
+        return slots
+
+    def summary(self, lot_id: str) -> Tuple[int, int, int]:
+        # (total, free, occupied), kept up to date by commit
+        return self._lot_states(lot_id).summary()
+
+    def coordinates(self, lot_id: str) -> Optional[Tuple[float, float]]:
+        if lot_id not in self._coordinates:
+            lot = self.lots.get(lot_id)
+            self._coordinates[lot_id] = lot.coordinates() if lot else None
+        return self._coordinates[lot_id]
+
+    def lot_summary(self, lot_id: str) -> Dict:
+        lot = self.lots.get(lot_id) or LotInfo(lot_id)
+        total, free, occupied = self.summary(lot_id)
+        return {
+            "lot_id": lot_id,
+            "name": lot.name,
+            "location": lot.location,
+            "coordinates": self.coordinates(lot_id),
+            "version": self.version(lot_id),
+            "total": total,
+            "free": free,
+            "occupied": occupied,
+        }
+
+    def body(self, lot_id: str, include_slots: bool = True) -> Tuple[str, bytes]:
+        # (etag, JSON body) for the lot, serialized at most once per version
+        self.reads += 1
+        etag = self.etag(lot_id)
+        cached = self._bodies.get((lot_id, include_slots))
+        if cached is not None and cached[0] == etag:
+            return cached
+
+        self.renders += 1
+        text = json.dumps(self.lot_summary(lot_id))
+        if include_slots:
+            # The summary's closing brace makes room for the ready slot fragments
+            text = text[:-1] + ', "slots": ' + self._lot_states(lot_id).json() + "}"
+        cached = self._bodies[(lot_id, include_slots)] = (etag, text.encode())
+        return cached
+
+    def nearby(self, latitude: float, longitude: float, radius_km: float,
+               limit: int = 20, min_free: int = 0) -> List[Dict]:
+        # Haversine distance to every lot with coordinates, vectorised over an
+        # array rebuilt only when lot metadata changes
+        if self._points is None:
+            located = [(lot_id, self.coordinates(lot_id)) for lot_id in self.lots]
+            located = [(lot_id, point) for lot_id, point in located if point is not None]
+            ids = [lot_id for lot_id, _ in located]
+            radians = np.radians(np.asarray([point for _, point in located], dtype=np.float64).reshape(-1, 2))
+            self._points = (ids, radians)
+        ids, radians = self._points
+        if not ids:
+            return []
+
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        a = (np.sin((radians[:, 0] - lat) / 2) ** 2
+             + math.cos(lat) * np.cos(radians[:, 0]) * np.sin((radians[:, 1] - lon) / 2) ** 2)
+        distances = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+        results = []
+        for i in np.argsort(distances):
+            if distances[i] > radius_km or len(results) >= limit:
+                break
+            summary = self.lot_summary(ids[i])
+            if summary["free"] >= min_free:
+                summary["distance_km"] = round(float(distances[i]), 3)
+                results.append(summary)
+        return results
+
+    def stats(self):
+        return {
+            "lots": len(self.lots),
+            "reads": self.reads,
+            "renders": self.renders,
+            "long_polls": self.long_polls,
+            "waiting_lots": len(self._events),
+        }
@@ -0,0 +1,64 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from availability import AvailabilityView
+
+SLOT_COUNTS = [10, 1000, 10000]
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server time of occupancy reads served from memory")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--lots", type=int, default=1000, help="lots for the nearby search")
+    args = parser.parse_args()
+
+    states = {}
+    view = AvailabilityView(lambda lot_id: states.get(lot_id, {}))
+    rng = random.Random(0)
+
+    for num_slots in SLOT_COUNTS:
+        lot_id = f"lot-{num_slots}"
+        view.set_lot(lot_id, "Lot", "Somewhere", 10.0, 80.0)
+        for n in range(1, num_slots + 1):
+            view.add_slot(lot_id, n, 10.0, 80.0)
+        states[lot_id] = {str(n): rng.random() < 0.5 for n in range(1, num_slots + 1)}
+
+        # The first read after startup or a metadata change builds the lot's states
+        build_us = timed(lambda: view.body(lot_id), 1)
+
+        # A detector change between every read: each read joins the slot fragments again
+        def changed_read():
+            slot = str(rng.randint(1, num_slots))
+            states[lot_id][slot] = not states[lot_id][slot]
+            view.commit(lot_id, {slot: states[lot_id][slot]})
+            view.body(lot_id)
+
+        changed_us = timed(changed_read, max(10, args.iterations // max(1, num_slots // 100)))
+        cached_us = timed(lambda: view.body(lot_id), args.iterations)
+        summary_us = timed(lambda: view.body(lot_id, include_slots=False), args.iterations)
+        print(f"{num_slots:>6} slots: cached read {cached_us:7.1f} us   summary {summary_us:7.1f} us   "
+              f"read after a change {changed_us:9.1f} us   first read {build_us:9.1f} us")
+
+    for i in range(args.lots):
+        lot_id = f"city-{i}"
+        view.set_lot(lot_id, "Lot", "City", 10.0 + rng.uniform(-0.5, 0.5), 80.0 + rng.uniform(-0.5, 0.5))
+        view.add_slot(lot_id, 1)
+    view.nearby(10.0, 80.0, 5.0)  # builds the coordinate array
+    nearby_us = timed(lambda: view.nearby(10.0, 80.0, 5.0, limit=20), args.iterations)
+    print(f"nearby over {len(view.lots)} lots, 5 km, up to 20 results: {nearby_us:7.1f} us")
+
+
+if __name__ == "__main__":
+    main()
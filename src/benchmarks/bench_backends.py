@@ -0,0 +1,126 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import cv2
+import numpy as np
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SRC_DIR)
+
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+from inference import load_model, detect, PYTORCH, ONNX, OPENVINO, DEFAULT_WEIGHTS
+
+# Latency, peak RSS and detection agreement of each CPU inference backend
+# against the PyTorch path, over frames sampled from a recorded clip. Every
+# backend runs in its own process so RSS is not shared between them.
+
+DEFAULT_VIDEO = os.path.join(SRC_DIR, "videos", "parking_lot_4.mp4")
+BACKENDS = [(PYTORCH, False), (ONNX, False), (ONNX, True), (OPENVINO, False), (OPENVINO, True)]
+
+
+def load_frames(video, count, step=10):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            if not frames:
+                raise RuntimeError(f"Could not read frames from {video}")
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frames.append(cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT)))
+        for _ in range(step - 1):
+            cap.grab()
+    cap.release()
+    return frames
+
+
+def run_backend(backend, int8, video, count, weights):
+    frames = load_frames(video, count)
+    start = time.perf_counter()
+    model = load_model(weights, backend, int8)
+    detect(model, frames[0], device="cpu")  # warm up
+    load_s = time.perf_counter() - start
+
+    latencies, detections = [], []
+    for frame in frames:
+        start = time.perf_counter()
+        boxes = detect(model, frame, device="cpu")
+        latencies.append(time.perf_counter() - start)
+        detections.append(boxes.tolist())
+
+    return {
+        "load_s": load_s,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p95_ms": float(np.percentile(latencies, 95) * 1000),
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "detections": detections,
+    }
+
+
+def iou(a, b):
+    xx1, yy1 = max(a[0], b[0]), max(a[1], b[1])
+    xx2, yy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, xx2 - xx1) * max(0.0, yy2 - yy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def agreement(reference, candidate, threshold=0.5):
+    # F1 of candidate boxes matched greedily to reference boxes of the same class
+    matched = total_ref = total_cand = 0
+    for ref_boxes, cand_boxes in zip(reference, candidate):
+        total_ref += len(ref_boxes)
+        total_cand += len(cand_boxes)
+        used = set()
+        for box in cand_boxes:
+            for i, ref in enumerate(ref_boxes):
+                if i not in used and ref[5] == box[5] and iou(ref, box) >= threshold:
+                    used.add(i)
+                    matched += 1
+                    break
+    if total_ref + total_cand == 0:
+        return 1.0
+    return 2 * matched / (total_ref + total_cand)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare CPU inference backends on a recorded clip")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--backend", help=argparse.SUPPRESS)
+    parser.add_argument("--int8", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.backend:
+        print(json.dumps(run_backend(args.backend, args.int8, args.video, args.frames, args.weights)))
+        return
+
+    reports = {}
+    for backend, int8 in BACKENDS:
+        name = f"{backend}{'-int8' if int8 else ''}"
+        command = [sys.executable, os.path.abspath(__file__), "--backend", backend,
+                   "--video", args.video, "--frames", str(args.frames), "--weights", args.weights]
+        if int8:
+            command.append("--int8")
+        result = subprocess.run(command, capture_output=True, text=True, cwd=SRC_DIR)
+        if result.returncode != 0:
+            print(f"{name:<14} failed: {result.stderr.strip().splitlines()[-1] if result.stderr else 'unknown error'}")
+            continue
+        reports[name] = json.loads(result.stdout.strip().splitlines()[-1])
+
+    reference = reports.get(PYTORCH)
+    for name, report in reports.items():
+        agree = agreement(reference["detections"], report["detections"]) if reference else float("nan")
+        print(f"{name:<14} load {report['load_s']:6.1f} s   p50 {report['p50_ms']:7.1f} ms   "
+              f"p95 {report['p95_ms']:7.1f} ms   RSS {report['rss_mb']:6.0f} MB   agreement {agree:.3f}")
+
+
+if __name__ == "__main__":
+    main()
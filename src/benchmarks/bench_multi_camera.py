@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+
+# Per-camera inference latency and total RAM for N cameras served by one
+# process with a shared model and batched predict, versus N separate
+# single-camera processes each holding its own model copy.
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..')
+DEFAULT_VIDEO = os.path.join(SRC_DIR, "videos", "parking_lot_4.mp4")
+
+
+def load_frames(video, count):
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frames.append(cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT)))
+        # Spread cameras over the clip so they do not see identical frames
+        cap.set(cv2.CAP_PROP_POS_FRAMES, cap.get(cv2.CAP_PROP_POS_FRAMES) + 25)
+    cap.release()
+    return frames
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def run_shared(weights, frames, rounds):
+    from ultralytics import YOLO
+    model = YOLO(weights)
+    model.predict(frames[:1], conf=0.7, device="cpu", verbose=False)  # warm up
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        model.predict(frames, conf=0.7, device="cpu", verbose=False)
+        samples.append(time.perf_counter() - start)
+    return median(samples)
+
+
+def worker(weights, video, index, rounds):
+    from ultralytics import YOLO
+    frame = load_frames(video, index + 1)[index]
+    model = YOLO(weights)
+    model.predict(frame, conf=0.7, device="cpu", verbose=False)
+
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        model.predict(frame, conf=0.7, device="cpu", verbose=False)
+        samples.append(time.perf_counter() - start)
+    print(json.dumps({"latency": median(samples), "rss_mb": max_rss_mb()}))
+
+
+def run_separate(weights, video, cameras, rounds):
+    # All processes run concurrently, competing for the same cores like they would in production
+    procs = [
+        subprocess.Popen(
+            [sys.executable, __file__, "--worker", str(i), "--weights", weights,
+             "--video", video, "--rounds", str(rounds)],
+            stdout=subprocess.PIPE, text=True, cwd=SRC_DIR
+        )
+        for i in range(cameras)
+    ]
+    reports = [json.loads(proc.communicate()[0].strip().splitlines()[-1]) for proc in procs]
+    return median([r["latency"] for r in reports]), sum(r["rss_mb"] for r in reports)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared batched model vs one process per camera")
+    parser.add_argument("--weights", default="yolo11m.pt")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--cameras", default="1,4,16")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--shared", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        worker(args.weights, args.video, args.worker, args.rounds)
+        return
+    if args.shared is not None:
+        latency = run_shared(args.weights, load_frames(args.video, args.shared), args.rounds)
+        print(json.dumps({"latency": latency, "rss_mb": max_rss_mb()}))
+        return
+
+    for cameras in [int(n) for n in args.cameras.split(",")]:
+        # A fresh process per measurement so peak RSS is not carried over
+        shared = subprocess.run(
+            [sys.executable, __file__, "--shared", str(cameras), "--weights", args.weights,
+             "--video", args.video, "--rounds", str(args.rounds)],
+            capture_output=True, text=True, cwd=SRC_DIR, check=True
+        )
+        report = json.loads(shared.stdout.strip().splitlines()[-1])
+        separate_latency, separate_rss = run_separate(args.weights, args.video, cameras, args.rounds)
+
+        # In the shared process every camera waits for the whole batch
+        print(f"{cameras:>3} cameras | shared+batched: per camera {report['latency'] * 1000:7.0f} ms "
+              f"(amortized {report['latency'] / cameras * 1000:5.0f} ms), RSS {report['rss_mb']:6.0f} MB | "
+              f"separate: per camera {separate_latency * 1000:7.0f} ms, RSS {separate_rss:6.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
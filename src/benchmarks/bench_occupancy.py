@@ -0,0 +1,97 @@
+import os
+import sys
+import time
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from occupancy import OccupancyEngine, CENTROID_MODE, COVERAGE_MODE, FRAME_WIDTH, FRAME_HEIGHT
+
+NUM_SLOTS = 500
+NUM_DETECTIONS = 100
+ROUNDS = 50
+CLASS_LIST = ["person", "bicycle", "car"]
+
+
+def make_layout(num_slots):
+    # Grid of slightly skewed quadrilaterals filling the 1020x500 frame
+    cols = 50
+    rows = (num_slots + cols - 1) // cols
+    w, h = FRAME_WIDTH // cols, FRAME_HEIGHT // rows
+    polylines, area_names = [], []
+    for i in range(num_slots):
+        x, y = (i % cols) * w, (i // cols) * h
+        polylines.append(np.array([[x, y], [x + w - 2, y], [x + w - 1, y + h - 2], [x + 1, y + h - 1]], np.int32))
+        area_names.append(str(i + 1))
+    return polylines, area_names
+
+
+def make_detections(rng, num_detections):
+    cx = rng.uniform(0, FRAME_WIDTH, num_detections)
+    cy = rng.uniform(0, FRAME_HEIGHT, num_detections)
+    bw = rng.uniform(20, 60, num_detections)
+    bh = rng.uniform(20, 40, num_detections)
+    detections = np.zeros((num_detections, 6))
+    detections[:, 0], detections[:, 2] = cx - bw / 2, cx + bw / 2
+    detections[:, 1], detections[:, 3] = cy - bh / 2, cy + bh / 2
+    detections[:, 4] = 0.9
+    detections[:, 5] = 2
+    return detections
+
+
+def legacy_centroid(polylines, area_names, detections):
+    # The original per-slot pointPolygonTest double loop from parking_slot_detection.py
+    detected_cars = []
+    for row in detections:
+        x1, y1, x2, y2, d = int(row[0]), int(row[1]), int(row[2]), int(row[3]), int(row[5])
+        if "car" in CLASS_LIST[d]:
+            detected_cars.append([(x1 + x2) // 2, (y1 + y2) // 2])
+
+    filled_slots = []
+    for i, polyline in enumerate(polylines):
+        for cx, cy in detected_cars:
+            if cv2.pointPolygonTest(polyline, (cx, cy), False) >= 0:
+                filled_slots.append(area_names[i])
+    free_slots = [name for name in area_names if name not in filled_slots]
+    return filled_slots, free_slots
+
+
+def timed(fn, frames):
+    samples = []
+    for detections in frames:
+        start = time.perf_counter()
+        fn(detections)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.median(samples), np.percentile(samples, 95)
+
+
+def main():
+    rng = np.random.default_rng(42)
+    polylines, area_names = make_layout(NUM_SLOTS)
+    frames = [make_detections(rng, NUM_DETECTIONS) for _ in range(ROUNDS)]
+
+    start = time.perf_counter()
+    centroid = OccupancyEngine(polylines, area_names, CLASS_LIST, mode=CENTROID_MODE)
+    coverage = OccupancyEngine(polylines, area_names, CLASS_LIST, mode=COVERAGE_MODE)
+    setup_ms = (time.perf_counter() - start) * 1000
+
+    results = {
+        "legacy centroid loop": timed(lambda d: legacy_centroid(polylines, area_names, d), frames),
+        "engine centroid": timed(centroid.evaluate, frames),
+        "engine coverage": timed(coverage.evaluate, frames),
+    }
+
+    print(f"{NUM_SLOTS} slots x {NUM_DETECTIONS} detections, {ROUNDS} frames (engine setup {setup_ms:.1f} ms)")
+    for name, (p50, p95) in results.items():
+        print(f"  {name:<22} p50 {p50:8.3f} ms   p95 {p95:8.3f} ms")
+
+    budget = results["legacy centroid loop"][0]
+    if results["engine coverage"][0] > budget:
+        print(f"FAIL: coverage mode exceeds the legacy centroid budget of {budget:.3f} ms")
+        sys.exit(1)
+    print("OK: coverage mode is within the legacy centroid budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slot_store import provision_slots
+
+SLOT_COUNTS = [10, 1000, 10000]
+
+
+class StandInSlotTable:
+    # Mimics prisma.parkingslot: a fixed round trip per query plus a small
+    # per-row cost for bulk inserts, with (lotId, slotNumber) unique.
+    def __init__(self, round_trip, row_cost):
+        self.rows = {}
+        self.ids = itertools.count(1)
+        self.round_trip = round_trip
+        self.row_cost = row_cost
+        self.queries = 0
+
+    async def _query(self, rows=1):
+        self.queries += 1
+        await asyncio.sleep(self.round_trip + self.row_cost * rows)
+
+    def _insert(self, data):
+        key = (data["lotId"], data["slotNumber"])
+        if key in self.rows:
+            raise RuntimeError(f"Unique constraint failed on lotId_slotNumber {key}")
+        row = type("Slot", (), dict(data, id=f"slot-{next(self.ids)}"))
+        self.rows[key] = row
+        return row
+
+    async def create(self, data):
+        await self._query()
+        return self._insert(data)
+
+    async def create_many(self, data):
+        await self._query(len(data))
+        for row in data:
+            self._insert(row)
+        return len(data)
+
+    async def find_many(self, where):
+        rows = [row for (lot_id, _), row in self.rows.items() if lot_id == where["lotId"]]
+        await self._query(len(rows))
+        return rows
+
+    async def upsert(self, where, data):
+        await self._query()
+        key = tuple(where["lotId_slotNumber"].values())
+        if key in self.rows:
+            for field, value in data["update"].items():
+                setattr(self.rows[key], field, value)
+            return self.rows[key]
+        return self._insert(data["create"])
+
+
+class StandInPrisma:
+    def __init__(self, round_trip, row_cost):
+        self.parkingslot = StandInSlotTable(round_trip, row_cost)
+
+
+async def legacy_provision(prisma, lot_id, locations):
+    # The previous /create_parking_slots: one awaited create per slot
+    for slot_number, location in locations.items():
+        await prisma.parkingslot.create(data={
+            "slotNumber": int(slot_number),
+            "locationX": location["lat"],
+            "locationY": location["long"],
+            "lotId": lot_id,
+            "status": True
+        })
+
+
+async def connect_prisma(database_url):
+    from prisma import Prisma
+    os.environ["DATABASE_URL"] = database_url
+    prisma = Prisma()
+    await prisma.connect()
+    return prisma
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return (time.perf_counter() - start) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Slot provisioning time, per-slot creates vs bulk create_many")
+    parser.add_argument("--round-trip-ms", type=float, default=1.0, help="stand-in query round trip")
+    parser.add_argument("--row-cost-us", type=float, default=5.0, help="stand-in per-row cost of bulk queries")
+    parser.add_argument("--database-url", help="benchmark a real MongoDB through Prisma instead")
+    parser.add_argument("--lot-ids", nargs=2, help="two existing lots without slots (with --database-url)")
+    args = parser.parse_args()
+
+    for i, num_slots in enumerate(SLOT_COUNTS):
+        locations = {n: {"lat": 10.0 + n * 1e-6, "long": 80.0} for n in range(1, num_slots + 1)}
+        if args.database_url:
+            prisma = await connect_prisma(args.database_url)
+            legacy_lot, bulk_lot = args.lot_ids[0], args.lot_ids[1]
+        else:
+            prisma = StandInPrisma(args.round_trip_ms / 1000, args.row_cost_us / 1e6)
+            legacy_lot, bulk_lot = f"legacy-{i}", f"bulk-{i}"
+
+        legacy_ms = await timed(legacy_provision(prisma, legacy_lot, locations))
+        bulk_ms = await timed(provision_slots(prisma, bulk_lot, locations))
+        # Re-running the setup must not create anything
+        rerun_ms = await timed(provision_slots(prisma, bulk_lot, locations))
+        print(f"{num_slots:>6} slots: per-slot create {legacy_ms:9.1f} ms   create_many {bulk_ms:8.1f} ms   "
+              f"idempotent re-run {rerun_ms:8.1f} ms")
+
+        if args.database_url:
+            await prisma.parkingslot.delete_many(where={"lotId": {"in": [legacy_lot, bulk_lot]}})
+            await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slot_store import write_slot_statuses
+
+SLOT_COUNTS = [50, 500, 5000]
+ROUNDS = 5
+
+
+class StandInSlotTable:
+    # Mimics prisma.parkingslot with a fixed round-trip per query and a
+    # bounded connection pool, which is what dominates against MongoDB.
+    def __init__(self, num_slots, round_trip, pool_size):
+        self.rows = {n: {"id": f"slot-{n}", "slotNumber": n, "status": True} for n in range(num_slots)}
+        self.round_trip = round_trip
+        self.pool = asyncio.Semaphore(pool_size)
+        self.queries = 0
+
+    async def _query(self):
+        async with self.pool:
+            self.queries += 1
+            await asyncio.sleep(self.round_trip)
+
+    async def find_first(self, where):
+        await self._query()
+        row = self.rows.get(where["slotNumber"])
+        return type("Slot", (), row) if row else None
+
+    async def update(self, where, data):
+        await self._query()
+        self.rows[int(where["id"].split("-")[1])].update(data)
+
+    async def update_many(self, where, data):
+        await self._query()
+        numbers = where["slotNumber"]["in"]
+        for n in numbers:
+            self.rows[n].update(data)
+        return len(numbers)
+
+
+class StandInPrisma:
+    def __init__(self, num_slots, round_trip, pool_size):
+        self.parkingslot = StandInSlotTable(num_slots, round_trip, pool_size)
+
+
+async def legacy_write(prisma, lot_id, slots):
+    # The previous find_first + update per slot, all gathered at once
+    async def update_slot_status(slot_number, status):
+        slot = await prisma.parkingslot.find_first(where={"lotId": lot_id, "slotNumber": int(slot_number)})
+        if slot:
+            await prisma.parkingslot.update(where={"id": slot.id}, data={"status": status})
+
+    await asyncio.gather(*(update_slot_status(n, s) for n, s in slots.items()))
+
+
+async def connect_prisma(database_url):
+    from prisma import Prisma
+    os.environ["DATABASE_URL"] = database_url
+    prisma = Prisma()
+    await prisma.connect()
+    return prisma
+
+
+async def measure(write, prisma, lot_id, slots):
+    samples = []
+    for i in range(ROUNDS):
+        # Alternate statuses so every round really changes the rows
+        message = {n: (i % 2 == 0) == (int(n) % 2 == 0) for n in slots}
+        start = time.perf_counter()
+        await write(prisma, lot_id, message)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-message slot status write latency")
+    parser.add_argument("--round-trip-ms", type=float, default=1.0, help="stand-in query round trip")
+    parser.add_argument("--pool-size", type=int, default=10, help="stand-in connection pool size")
+    parser.add_argument("--database-url", help="benchmark a real MongoDB through Prisma instead")
+    parser.add_argument("--lot-id", help="existing lot id with enough slots (with --database-url)")
+    args = parser.parse_args()
+
+    for num_slots in SLOT_COUNTS:
+        if args.database_url:
+            prisma = await connect_prisma(args.database_url)
+            lot_id = args.lot_id
+        else:
+            prisma = StandInPrisma(num_slots, args.round_trip_ms / 1000, args.pool_size)
+            lot_id = "stand-in"
+
+        slots = [str(n) for n in range(num_slots)]
+        legacy_ms = await measure(legacy_write, prisma, lot_id, slots)
+        bulk_ms = await measure(write_slot_statuses, prisma, lot_id, slots)
+        print(f"{num_slots:>5} slots: find_first+update {legacy_ms:9.1f} ms   update_many {bulk_ms:7.1f} ms")
+
+        if args.database_url:
+            await prisma.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slot_protocol import SlotUpdateEncoder
+from spool import SlotSpool
+
+
+async def append_latencies(spool, encoder, messages, slots, fsync_each):
+    # Time the detector pays per message; fsync_each adds the fsync inline
+    samples = []
+    for i in range(messages):
+        message = encoder.encode({str(n): (i + n) % 2 == 0 for n in range(slots)}, snapshot=(i % 50 == 0))
+        start = time.perf_counter()
+        spool.append(message)
+        if fsync_each:
+            os.fsync(spool._fd)
+        samples.append(time.perf_counter() - start)
+        if i % 100 == 0:
+            # Let the batched fsync task run, as the detection loop would
+            await asyncio.sleep(0)
+    return np.asarray(samples) * 1e6
+
+
+async def run(args):
+    for fsync_each in (False, True):
+        directory = tempfile.mkdtemp(prefix="parkease_spool_bench_", dir=args.dir)
+        spool = SlotSpool(directory, name="bench")
+        spool.start()
+        start = time.perf_counter()
+        us = await append_latencies(spool, SlotUpdateEncoder(), args.messages, args.slots, fsync_each)
+        wall = time.perf_counter() - start
+        await spool.stop()
+        label = "fsync per message" if fsync_each else f"fsync every {spool.fsync_interval}s"
+        print(f"{label:>22}: append p50 {np.percentile(us, 50):7.1f} us   p99 {np.percentile(us, 99):8.1f} us   "
+              f"{args.messages / wall:9.0f} msg/s   segments {spool.stats()['segments']}")
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spool append cost per slot message")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--slots", type=int, default=10, help="slots per delta (snapshots every 50th message)")
+    parser.add_argument("--dir", help="directory on the disk the detector will spool to")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slot_protocol import SlotUpdateEncoder
+
+# Simulates many detectors streaming slot deltas to a running
+# websocket_server_fastapi.py, one lot per detector, and reports acked
+# messages/s and ack latency for each connection count.
+
+SLOTS_PER_LOT = 400
+CHANGES_PER_MESSAGE = 3
+
+
+def synthetic_lot_id(i):
+    # ObjectId-shaped so Prisma accepts it; no slots match, so no rows are written
+    return f"{0xfeed0000 + i:08x}" + "0" * 16
+
+
+async def run_detector(url, lot_id, duration, window, latencies):
+    encoder = SlotUpdateEncoder()
+    statuses = {str(n): True for n in range(1, SLOTS_PER_LOT + 1)}
+    in_flight = {}
+    slots_free = asyncio.Semaphore(window)
+    acked = 0
+
+    async with websockets.connect(f"{url}/update_slot_status/{lot_id}") as websocket:
+        async def receive():
+            nonlocal acked
+            async for raw in websocket:
+                reply = json.loads(raw)
+                if reply.get("type") == "ack":
+                    sent_at = in_flight.pop(reply["seq"], None)
+                    if sent_at is not None:
+                        latencies.append(time.perf_counter() - sent_at)
+                        acked += 1
+                        slots_free.release()
+
+        receiver = asyncio.create_task(receive())
+        await websocket.send(json.dumps(encoder.encode(statuses, snapshot=True)))
+
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await slots_free.acquire()
+            changed = {}
+            for slot in random.sample(list(statuses), CHANGES_PER_MESSAGE):
+                statuses[slot] = not statuses[slot]
+                changed[slot] = statuses[slot]
+            message = encoder.encode(changed)
+            in_flight[message["seq"]] = time.perf_counter()
+            await websocket.send(json.dumps(message))
+
+        await asyncio.sleep(0.5)
+        receiver.cancel()
+    return acked
+
+
+async def run_round(url, num_detectors, duration, window, lot_ids):
+    latencies = []
+    start = time.perf_counter()
+    acked = await asyncio.gather(*(
+        run_detector(url, lot_ids[i % len(lot_ids)] if lot_ids else synthetic_lot_id(i), duration, window, latencies)
+        for i in range(num_detectors)
+    ))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0
+    return sum(acked) / elapsed, p50, p99
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the slot status endpoint with simulated detectors")
+    parser.add_argument("--url", default="ws://127.0.0.1:5000", help="server base URL")
+    parser.add_argument("--detectors", default="1,4,16,64", help="comma separated connection counts")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per round")
+    parser.add_argument("--window", type=int, default=8, help="unacked messages allowed per detector")
+    parser.add_argument("--lot-ids", default="", help="comma separated real lot ids to use instead of synthetic ones")
+    args = parser.parse_args()
+
+    lot_ids = [lot_id for lot_id in args.lot_ids.split(",") if lot_id]
+    for num_detectors in [int(n) for n in args.detectors.split(",")]:
+        throughput, p50, p99 = await run_round(args.url, num_detectors, args.duration, args.window, lot_ids)
+        print(f"{num_detectors:>4} detectors: {throughput:9.1f} msg/s   ack p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+
+import websockets
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from slot_protocol import SlotUpdateEncoder
+
+# Opens many dashboard subscriptions on one lot of a running
+# websocket_server_fastapi.py, then plays detector and measures how long
+# each slot change takes to reach every subscriber.
+
+SLOTS_PER_LOT = 400
+
+
+async def subscribe(url, lot_id, ready, versions, received):
+    async with websockets.connect(f"{url}/subscribe/{lot_id}", max_queue=None) as websocket:
+        snapshot = json.loads(await websocket.recv())
+        versions.append((snapshot["version"], snapshot["slots"]))
+        ready.release()
+        async for raw in websocket:
+            message = json.loads(raw)
+            received.append((message["type"], message["version"], time.perf_counter()))
+    return snapshot
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test per-lot slot subscriptions")
+    parser.add_argument("--url", default="ws://127.0.0.1:5000", help="server base URL")
+    parser.add_argument("--lot-id", default="feed0000" + "0" * 16, help="lot to subscribe to")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=20, help="slot changes to fan out")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between slot changes")
+    args = parser.parse_args()
+
+    # Every subscriber is one socket on this side too
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, max(soft, args.subscribers * 2 + 100)), hard))
+
+    ready = asyncio.Semaphore(0)
+    versions = []
+    received = []
+    subscribers = []
+    start = time.perf_counter()
+    for i in range(args.subscribers):
+        subscribers.append(asyncio.create_task(subscribe(args.url, args.lot_id, ready, versions, received)))
+        if i % 200 == 199:
+            await asyncio.sleep(0.05)
+    for _ in range(args.subscribers):
+        await ready.acquire()
+    print(f"{args.subscribers} subscribers connected in {time.perf_counter() - start:.1f}s")
+
+    # Deltas only: each one changes a slot, so the lot version grows by one per message
+    base_version, current = max(versions, key=lambda v: v[0])
+    encoder = SlotUpdateEncoder()
+    statuses = {str(n): current.get(str(n), True) for n in range(1, SLOTS_PER_LOT + 1)}
+    sent_at = []
+    async with websockets.connect(f"{args.url}/update_slot_status/{args.lot_id}") as detector:
+        for i in range(args.messages):
+            slot = str(i % SLOTS_PER_LOT + 1)
+            statuses[slot] = not statuses[slot]
+            sent_at.append(time.perf_counter())
+            await detector.send(json.dumps(encoder.encode({slot: statuses[slot]})))
+            await asyncio.sleep(args.interval)
+        await asyncio.sleep(2.0)
+
+    for task in subscribers:
+        task.cancel()
+
+    deltas = [(version, at) for kind, version, at in received if kind == "delta"]
+    resyncs = sum(1 for kind, _, _ in received if kind == "snapshot")
+    if not deltas:
+        print("No deltas received")
+        return
+    latencies = sorted(
+        (at - sent_at[version - base_version - 1]) * 1000
+        for version, at in deltas if 0 < version - base_version <= len(sent_at)
+    )
+    expected = args.subscribers * args.messages
+    print(f"delivered {len(deltas)}/{expected} deltas, {resyncs} resync snapshots")
+    print(f"fan-out latency p50 {latencies[len(latencies) // 2]:.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.2f} ms   max {latencies[-1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SRC_DIR)
+
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT, CENTROID_MODE, COVERAGE_MODE
+from camera_pipeline import CameraPipeline
+from inference import detect, load_model, FULL_FRAME, ROI_TILES, PYTORCH, ONNX, OPENVINO, DEFAULT_WEIGHTS
+from change_gate import DEFAULT_REFRESH_EVERY
+from slot_layout import SlotLayout
+
+# Offline replay of the detection pipeline over a recorded clip, as fast as
+# the stages allow: decode -> change gate -> inference -> occupancy -> emit.
+# Nothing is sent to a server; emitted messages are only counted. Writes a
+# JSON report and, given --baseline, exits 1 when throughput or any stage's
+# p95 regressed by more than --max-regression.
+#
+#   python benchmarks/replay_pipeline.py --stub --layout parkease.layout --output report.json
+#   python benchmarks/replay_pipeline.py --stub --layout parkease.layout --baseline report.json
+
+DEFAULT_VIDEO = os.path.join(SRC_DIR, "videos", "parking_lot_4.mp4")
+STAGES = ["decode", "gate", "inference", "occupancy", "emit"]
+
+
+class _StubTensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _StubResult:
+    def __init__(self, array):
+        self.boxes = type("Boxes", (), {"data": _StubTensor(array)})()
+
+
+class StubModel:
+    """Stands in for YOLO with boxes on the marked slots, so the non-ML stages
+    can be measured without weights.
+
+    Each predicted frame, every slot independently flips between empty and
+    holding a car with probability `flip_rate`. Tiled frames are expected as
+    consecutive crops in the tiler's order, the way detect_batch sends them.
+    """
+
+    def __init__(self, polylines, class_id, tiler=None, flip_rate=0.01, latency=0.0, seed=0):
+        self.tiler = tiler
+        self.class_id = class_id
+        self.flip_rate = flip_rate
+        self.latency = latency
+        self.rng = np.random.default_rng(seed)
+        self.occupied = self.rng.random(len(polylines)) < 0.5
+
+        # A car is the slot's bounding box shrunk by 10% on each side
+        boxes = []
+        for polyline in polylines:
+            x, y, w, h = cv2.boundingRect(np.asarray(polyline, np.int32))
+            boxes.append([x + 0.1 * w, y + 0.1 * h, x + 0.9 * w, y + 0.9 * h])
+        self.boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+    def _frame_detections(self):
+        self.occupied ^= self.rng.random(self.occupied.size) < self.flip_rate
+        boxes = self.boxes[self.occupied]
+        detections = np.zeros((len(boxes), 6))
+        detections[:, :4] = boxes
+        detections[:, 4] = 0.9
+        detections[:, 5] = self.class_id
+        return detections
+
+    def _tile_detections(self, detections, tile):
+        x0, y0, x1, y1 = tile
+        cx = (detections[:, 0] + detections[:, 2]) / 2
+        cy = (detections[:, 1] + detections[:, 3]) / 2
+        inside = detections[(cx >= x0) & (cx < x1) & (cy >= y0) & (cy < y1)].copy()
+        inside[:, [0, 2]] = np.clip(inside[:, [0, 2]] - x0, 0, x1 - x0)
+        inside[:, [1, 3]] = np.clip(inside[:, [1, 3]] - y0, 0, y1 - y0)
+        return inside
+
+    def predict(self, images, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.tiler is None:
+            return [_StubResult(self._frame_detections()) for _ in images]
+
+        results = []
+        per_frame = len(self.tiler.tiles)
+        for start in range(0, len(images), per_frame):
+            detections = self._frame_detections()
+            results.extend(_StubResult(self._tile_detections(detections, tile)) for tile in self.tiler.tiles)
+        return results
+
+
+def write_grid_layout(num_slots):
+    # Grid of slot quadrilaterals over the frame, saved like mark_slots.py does
+    cols = max(1, int(np.ceil(np.sqrt(num_slots * FRAME_WIDTH / FRAME_HEIGHT))))
+    rows = (num_slots + cols - 1) // cols
+    w, h = FRAME_WIDTH // cols, FRAME_HEIGHT // rows
+    polylines, area_names = [], []
+    for i in range(num_slots):
+        x, y = (i % cols) * w, (i // cols) * h
+        polylines.append(np.array([[x, y], [x + w - 2, y], [x + w - 1, y + h - 2], [x + 1, y + h - 1]], np.int32))
+        area_names.append(str(i + 1))
+
+    fd, path = tempfile.mkstemp(prefix="replay_layout_", suffix=".layout")
+    os.close(fd)
+    return SlotLayout(polylines, area_names).save(path)
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def replay(args, class_list):
+    layout = args.layout or write_grid_layout(args.synthetic_slots)
+    try:
+        pipeline = CameraPipeline(
+            "replay", layout, class_list, None,
+            occupancy_mode=args.occupancy_mode, confirm_cycles=args.confirm_cycles,
+            inference_mode=args.inference_mode, change_gate=args.change_gate, refresh_every=args.refresh_every
+        )
+    finally:
+        if not args.layout:
+            os.remove(layout)
+
+    if args.stub:
+        model = StubModel(pipeline.polylines, class_list.index("car"), pipeline.tiler,
+                          flip_rate=args.stub_flip_rate, latency=args.stub_latency / 1000)
+    else:
+        model = load_model(args.weights, args.backend, args.int8)
+        detect(model, np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), np.uint8), pipeline.tiler, device="cpu")  # warm up
+
+    cap = cv2.VideoCapture(args.video)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open {args.video}")
+    video_fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+
+    timings = {stage: [] for stage in STAGES}
+    events = {"messages": 0, "deltas": 0, "snapshots": 0, "slot_changes": 0}
+    frames = inferred = 0
+    loops = 0
+
+    start = time.perf_counter()
+    while frames < args.max_frames:
+        t0 = time.perf_counter()
+        ok, frame = cap.read()
+        if not ok:
+            loops += 1
+            if loops >= args.loops:
+                break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            continue
+        frame = cv2.resize(frame, (FRAME_WIDTH, FRAME_HEIGHT))
+        timings["decode"].append(time.perf_counter() - t0)
+        frames += 1
+
+        if (frames - 1) % args.every:
+            continue
+        # Video time, so snapshot intervals behave as they would live
+        now = frames / video_fps
+
+        t0 = time.perf_counter()
+        run = pipeline.needs_inference(frame)
+        timings["gate"].append(time.perf_counter() - t0)
+
+        detections = None
+        if run:
+            t0 = time.perf_counter()
+            detections = detect(model, frame, pipeline.tiler, device="cpu")
+            timings["inference"].append(time.perf_counter() - t0)
+            inferred += 1
+
+        t0 = time.perf_counter()
+        occupied = pipeline.observe(detections)
+        timings["occupancy"].append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        message = pipeline.emit(occupied, now)
+        timings["emit"].append(time.perf_counter() - t0)
+
+        if message:
+            events["messages"] += 1
+            events["snapshots" if message["type"] == "snapshot" else "deltas"] += 1
+            if message["type"] != "snapshot":
+                events["slot_changes"] += len(message["slots"])
+    wall = time.perf_counter() - start
+    cap.release()
+
+    return {
+        "video": os.path.basename(args.video),
+        "layout": args.layout or f"synthetic:{args.synthetic_slots}",
+        "slots": pipeline.occupancy_engine.num_slots,
+        "model": "stub" if args.stub else f"{args.weights}:{args.backend}{':int8' if args.int8 else ''}",
+        "inference_mode": args.inference_mode if pipeline.tiler else FULL_FRAME,
+        "occupancy_mode": args.occupancy_mode,
+        "frames": frames,
+        "inferred": inferred,
+        "wall_s": round(wall, 3),
+        "fps": round(frames / wall, 2) if wall else 0.0,
+        "stages": {stage: percentiles(samples) for stage, samples in timings.items()},
+        "events": events,
+        "tracker": pipeline.slot_tracker.stats(),
+        "change_gate": pipeline.change_gate.stats() if pipeline.change_gate else None,
+    }
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    if report["fps"] < baseline["fps"] * (1 - tolerance):
+        found.append(f"fps {report['fps']} < baseline {baseline['fps']}")
+    for stage, stats in report["stages"].items():
+        before = baseline.get("stages", {}).get(stage, {})
+        if "p95_ms" in stats and before.get("p95_ms") and stats["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            found.append(f"{stage} p95 {stats['p95_ms']} ms > baseline {before['p95_ms']} ms")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded clip through the detection pipeline")
+    parser.add_argument("--video", default=DEFAULT_VIDEO)
+    parser.add_argument("--layout", help="slot layout from mark_slots.py (default: a synthetic grid)")
+    parser.add_argument("--synthetic-slots", type=int, default=40)
+    parser.add_argument("--stub", action="store_true", help="replace YOLO with a stub model")
+    parser.add_argument("--stub-flip-rate", type=float, default=0.01)
+    parser.add_argument("--stub-latency", type=float, default=0.0, help="simulated inference time in ms")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS)
+    parser.add_argument("--backend", default=PYTORCH, choices=[PYTORCH, ONNX, OPENVINO])
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--occupancy-mode", default=CENTROID_MODE, choices=[CENTROID_MODE, COVERAGE_MODE])
+    parser.add_argument("--inference-mode", default=FULL_FRAME, choices=[FULL_FRAME, ROI_TILES])
+    parser.add_argument("--change-gate", action="store_true")
+    parser.add_argument("--refresh-every", type=int, default=DEFAULT_REFRESH_EVERY)
+    parser.add_argument("--confirm-cycles", type=int, default=2)
+    parser.add_argument("--every", type=int, default=1, help="run the pipeline on every Nth decoded frame")
+    parser.add_argument("--max-frames", type=int, default=1000)
+    parser.add_argument("--loops", type=int, default=1, help="times to replay the clip")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+
+    with open(os.path.join(SRC_DIR, "coco.txt"), "r") as f:
+        class_list = f.read().split("\n")
+
+    report = replay(args, class_list)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        found = regressions(report, baseline, args.max_regression)
+        for line in found:
+            print(f"REGRESSION: {line}")
+        if found:
+            sys.exit(1)
+        print(f"No regression beyond {args.max_regression:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
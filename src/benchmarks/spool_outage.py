@@ -0,0 +1,142 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, SRC_DIR)
+
+from slot_protocol import SlotUpdateEncoder
+from publisher import SlotEventPublisher
+from spool import SlotSpool
+
+# Kills the server mid-stream and checks that no slot change is lost: a
+# simulated detector publishes through a spool while the server is SIGKILLed,
+# stays down, and is started again (optionally restarting the detector
+# during the outage too). Passes when every message is acked and the
+# server's occupancy for the lot equals the detector's final state.
+# Needs the server's environment (DATABASE_URL) like a normal start.
+#
+#   python benchmarks/spool_outage.py --messages 400 --kill-at 100 --down-for 100 --restart-detector
+
+
+def start_server(port):
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "websocket_server_fastapi:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC_DIR,
+    )
+
+
+def get_json(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return json.loads(response.read())
+
+
+async def wait_ready(port, timeout=30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            get_json(f"http://127.0.0.1:{port}/detectors")
+            return
+        except Exception:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def open_detector(url, spool_dir, encoder):
+    spool = SlotSpool(spool_dir, fsync_interval=0.1, name="outage")
+    if spool.last:
+        encoder.resume(spool.last)
+    publisher = SlotEventPublisher(url, on_resync=encoder.request_snapshot, name="outage", spool=spool)
+    publisher.start()
+    return publisher
+
+
+async def run(args):
+    url = f"ws://127.0.0.1:{args.port}/update_slot_status/{args.lot_id}"
+    spool_dir = tempfile.mkdtemp(prefix="parkease_spool_")
+    rng = random.Random(0)
+    state = {str(n): True for n in range(1, args.slots + 1)}
+
+    server = start_server(args.port)
+    await wait_ready(args.port)
+    encoder = SlotUpdateEncoder()
+    publisher = open_detector(url, spool_dir, encoder)
+    restarted = False
+
+    try:
+        for i in range(args.messages):
+            if i == args.kill_at:
+                server.kill()
+                server.wait()
+                print(f"message {i}: server killed")
+            if i == args.kill_at + args.down_for:
+                server = start_server(args.port)
+                await wait_ready(args.port)
+                print(f"message {i}: server restarted, spool {publisher.spool.stats()}")
+            if args.restart_detector and not restarted and i == args.kill_at + args.down_for // 2:
+                # Detector crash during the outage: the spool is reopened from disk
+                await publisher.stop()
+                encoder = SlotUpdateEncoder()
+                publisher = open_detector(url, spool_dir, encoder)
+                restarted = True
+                print(f"message {i}: detector restarted, resumed at seq {encoder.seq}")
+
+            slot = str(rng.randint(1, args.slots))
+            state[slot] = not state[slot]
+            if encoder.snapshot_due():
+                message = encoder.encode(state, snapshot=True)
+            else:
+                message = encoder.encode({slot: state[slot]})
+            publisher.publish(message)
+            await asyncio.sleep(1 / args.rate)
+
+        deadline = time.time() + args.drain_timeout
+        while publisher.spool.acked_seq != encoder.seq and time.time() < deadline:
+            await asyncio.sleep(0.1)
+
+        occupancy = get_json(f"http://127.0.0.1:{args.port}/lots/{args.lot_id}/occupancy")
+        detectors = get_json(f"http://127.0.0.1:{args.port}/detectors")
+        mismatched = sorted((n for n in state if occupancy["slots"].get(n) != state[n]), key=int)
+        print(json.dumps({
+            "last_seq": encoder.seq,
+            "acked_seq": publisher.spool.acked_seq,
+            "publisher": publisher.stats(),
+            "spool": publisher.spool.stats(),
+            "server": detectors.get(args.lot_id),
+            "mismatched_slots": mismatched,
+        }, indent=2))
+        ok = publisher.spool.acked_seq == encoder.seq and not mismatched
+        print("PASS" if ok else "FAIL")
+        return ok
+    finally:
+        await publisher.stop()
+        server.kill()
+        server.wait()
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kill the server mid-stream and check the spool loses nothing")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--lot-id", default="65f000000000000000000001")
+    parser.add_argument("--slots", type=int, default=40)
+    parser.add_argument("--messages", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=40.0, help="messages per second")
+    parser.add_argument("--kill-at", type=int, default=100, help="message index to kill the server at")
+    parser.add_argument("--down-for", type=int, default=100, help="messages published while it is down")
+    parser.add_argument("--restart-detector", action="store_true", help="also restart the detector during the outage")
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import logging
+import os
+import time
+import numpy as np
+from prometheus_client import Counter, Histogram
+from occupancy import OccupancyEngine, CENTROID_MODE, FRAME_WIDTH, FRAME_HEIGHT
+from slot_tracker import SlotStateTracker, DEFAULT_CONFIRM_CYCLES
+from slot_protocol import SlotUpdateEncoder
+from publisher import SlotEventPublisher
+from spool import SlotSpool, SPOOL_MAX_BYTES
+from roi_tiles import RoiTiler
+from inference import FULL_FRAME, ROI_TILES
+from change_gate import SlotChangeGate, DEFAULT_REFRESH_EVERY
+from observability import FAST_BUCKETS
+from slot_layout import SlotLayout, DEFAULT_LAYOUT_PATH
+
+OCCUPANCY_SECONDS = Histogram("parkease_occupancy_seconds", "Occupancy evaluation time per cycle",
+                              ["camera"], buckets=FAST_BUCKETS)
+EMIT_SECONDS = Histogram("parkease_emit_seconds", "Debounce, encode and enqueue time per cycle",
+                         ["camera"], buckets=FAST_BUCKETS)
+SLOT_FLIPS = Counter("parkease_slot_flips_total", "Debounced slot transitions", ["camera"])
+MESSAGES = Counter("parkease_slot_messages_total", "Slot messages emitted", ["camera", "type"])
+INFERENCE_SKIPPED = Counter("parkease_inference_skipped_total", "Cycles the change gate skipped", ["camera"])
+
+logger = logging.getLogger(__name__)
+
+
+def load_layout(path=DEFAULT_LAYOUT_PATH, mmap=True):
+    # mmap=False copies the arrays, for files that may be overwritten in place
+    layout = SlotLayout.load(path, mmap=mmap)
+    if layout.labels is None or layout.labels.shape != (FRAME_HEIGHT, FRAME_WIDTH):
+        raise ValueError(f"{path} was marked at {layout.frame_size}, frames are {(FRAME_WIDTH, FRAME_HEIGHT)}")
+    return layout
+
+
+class CameraPipeline:
+    """Per-camera state from detections to outgoing slot messages.
+
+    Holds the camera's slot layout, occupancy engine, debouncing tracker,
+    message encoder and publisher, so several cameras can share one model.
+    `swap_layout` replaces the layout and everything derived from it between
+    two cycles, keeping the state of slots present in both layouts.
+    """
+
+    def __init__(self, name, layout_path, class_list, websocket_url,
+                 occupancy_mode=CENTROID_MODE, confirm_cycles=DEFAULT_CONFIRM_CYCLES,
+                 inference_mode=FULL_FRAME, change_gate=False, refresh_every=DEFAULT_REFRESH_EVERY,
+                 spool_dir=None, spool_max_bytes=SPOOL_MAX_BYTES, layout_mmap=True):
+        self.name = name
+        self.layout_path = layout_path
+        self.class_list = class_list
+        self.occupancy_mode = occupancy_mode
+        self.confirm_cycles = confirm_cycles
+        self.inference_mode = inference_mode
+        self.use_change_gate = change_gate
+        self.refresh_every = refresh_every
+        self.slot_tracker = None
+        self.swap_layout(load_layout(layout_path, mmap=layout_mmap))
+        self.slot_encoder = SlotUpdateEncoder()
+        # One long-lived connection; publishing never waits on the server.
+        # Without a URL (offline replay) messages are only returned.
+        self.publisher = None
+        if websocket_url:
+            # With a spool directory messages survive server outages and
+            # detector restarts, and the session's sequence carries on
+            spool = None
+            if spool_dir:
+                spool = SlotSpool(os.path.join(spool_dir, name), max_bytes=spool_max_bytes, name=name)
+                if spool.last:
+                    self.slot_encoder.resume(spool.last)
+            self.publisher = SlotEventPublisher(
+                websocket_url, on_resync=self.slot_encoder.request_snapshot, name=name, spool=spool
+            )
+        self.activity = 0
+
+    def swap_layout(self, layout):
+        # Everything is built before anything is assigned, so a bad layout
+        # leaves the running one untouched
+        polylines, area_names = layout.polylines, layout.area_names
+
+        # ROI tiles only pay off when the slots leave part of the frame uncovered
+        tiler = None
+        if self.inference_mode == ROI_TILES:
+            candidate = RoiTiler(polylines, labels=layout.labels)
+            if candidate.covered_ratio < 1.0:
+                tiler = candidate
+                logger.info("roi inference camera=%s tiles=%d coverage=%.2f",
+                            self.name, len(tiler.tiles), tiler.covered_ratio)
+            else:
+                logger.info("slots cover the whole frame, using full-frame inference camera=%s", self.name)
+
+        # Skip YOLO while no slot region changes; statuses are carried forward
+        change_gate = None
+        if self.use_change_gate:
+            change_gate = SlotChangeGate(polylines, refresh_every=self.refresh_every, labels=layout.labels)
+
+        # The layout's precomputed label mask makes every cycle a single lookup
+        occupancy_engine = OccupancyEngine(
+            polylines, area_names, self.class_list, mode=self.occupancy_mode,
+            thresholds=layout.thresholds, labels=layout.labels
+        )
+        slot_tracker = SlotStateTracker(
+            occupancy_engine.num_slots, fill_after=self.confirm_cycles, free_after=self.confirm_cycles
+        )
+        if self.slot_tracker is not None and self.slot_tracker.initialized:
+            # Slots kept by name keep their debounced state; new ones start free
+            previous = {name: i for i, name in enumerate(self.area_names)}
+            kept = [(i, previous[name]) for i, name in enumerate(area_names) if name in previous]
+            if kept:
+                new, old = np.asarray(kept).T
+                slot_tracker.state[new] = self.slot_tracker.state[old]
+            slot_tracker.initialized = True
+            for counter in ("observations", "transitions", "suppressed_flickers"):
+                setattr(slot_tracker, counter, getattr(self.slot_tracker, counter))
+            # The server learns the new slot set from a snapshot
+            self.slot_encoder.request_snapshot()
+
+        self.layout = layout
+        self.polylines, self.area_names = polylines, area_names
+        self.tiler, self.change_gate = tiler, change_gate
+        self.occupancy_engine, self.slot_tracker = occupancy_engine, slot_tracker
+        self.last_occupied = None
+        self.filled_slots, _ = occupancy_engine.split(slot_tracker.state)
+
+    def slot_statuses(self, indices):
+        # ParkingSlot.status convention: True = free
+        return {self.area_names[i]: not self.slot_tracker.state[i] for i in indices}
+
+    def needs_inference(self, frame):
+        if self.change_gate is None:
+            return True
+        if self.slot_tracker.streak.any():
+            # A pending flip is only confirmed by fresh observations, never by
+            # repeats of the one that started it
+            return True
+        run, _ = self.change_gate.check(frame)
+        if not run:
+            INFERENCE_SKIPPED.labels(camera=self.name).inc()
+        return run
+
+    def observe(self, detections):
+        # detections is None when inference was skipped, which needs_inference
+        # only allows with no streak pending: the last observation then
+        # matches the tracker state and repeating it changes nothing
+        if detections is not None:
+            start = time.perf_counter()
+            self.last_occupied = self.occupancy_engine.occupied(detections)
+            OCCUPANCY_SECONDS.labels(camera=self.name).observe(time.perf_counter() - start)
+        return self.last_occupied
+
+    def emit(self, occupied, now):
+        if occupied is None:
+            return None
+        start = time.perf_counter()
+
+        # Send only debounced transitions, with a periodic full snapshot for resync
+        flipped = self.slot_tracker.update(occupied)
+        # Slots flipping or still waiting on debounce; the startup snapshot is not activity
+        if self.slot_tracker.observations > 1:
+            self.activity = int(flipped.size + np.count_nonzero(self.slot_tracker.streak))
+            SLOT_FLIPS.labels(camera=self.name).inc(flipped.size)
+        if self.slot_encoder.snapshot_due(now):
+            message = self.slot_encoder.encode(
+                self.slot_statuses(range(len(self.area_names))), snapshot=True, now=now
+            )
+        elif flipped.size:
+            message = self.slot_encoder.encode(self.slot_statuses(flipped), now=now)
+        else:
+            EMIT_SECONDS.labels(camera=self.name).observe(time.perf_counter() - start)
+            return None
+
+        if self.publisher:
+            self.publisher.publish(message)
+        self.filled_slots, _ = self.occupancy_engine.split(self.slot_tracker.state)
+        MESSAGES.labels(camera=self.name, type=message["type"]).inc()
+        EMIT_SECONDS.labels(camera=self.name).observe(time.perf_counter() - start)
+        return message
+
+    def update(self, detections, now):
+        return self.emit(self.observe(detections), now)
@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+
+DEFAULT_DOWNSCALE = 4
+DEFAULT_PIXEL_THRESHOLD = 25  # gray levels
+DEFAULT_DIRTY_FRACTION = 0.08  # of a slot's pixels
+DEFAULT_REFRESH_EVERY = 15  # cycles
+
+
+class SlotChangeGate:
+    """Decides per cycle whether any slot changed enough to be worth running YOLO.
+
+    Each frame is reduced to a blurred, downsampled grayscale image and
+    compared with the one from the last inference. A slot is dirty when
+    more than `dirty_fraction` of its pixels changed by over
+    `pixel_threshold` gray levels. Inference is forced every
+    `refresh_every` cycles so slow drift (lighting, a parked car never
+    seen) is still picked up.
+    """
+
+    def __init__(self, polylines, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), downscale=DEFAULT_DOWNSCALE,
+                 pixel_threshold=DEFAULT_PIXEL_THRESHOLD, dirty_fraction=DEFAULT_DIRTY_FRACTION,
+                 refresh_every=DEFAULT_REFRESH_EVERY, labels=None):
+        width, height = frame_size
+        self.small_size = (max(1, width // downscale), max(1, height // downscale))
+        self.pixel_threshold = pixel_threshold
+        self.dirty_fraction = dirty_fraction
+        self.refresh_every = refresh_every
+        self.num_slots = len(polylines)
+
+        if labels is not None:
+            # The layout's full-size label mask, sampled at each block's centre
+            offset = downscale // 2
+            self.labels = labels[offset::downscale, offset::downscale][:self.small_size[1], :self.small_size[0]]
+            self.labels = self.labels.astype(np.int32)
+        else:
+            self.labels = np.full((self.small_size[1], self.small_size[0]), -1, dtype=np.int32)
+            for i, polyline in enumerate(polylines):
+                scaled = (np.asarray(polyline, np.float64) / downscale).round().astype(np.int32)
+                cv2.fillPoly(self.labels, [scaled.reshape(-1, 1, 2)], i)
+        self.inside = self.labels >= 0
+        self.slot_pixels = np.maximum(np.bincount(self.labels[self.inside], minlength=self.num_slots), 1)
+
+        self.reference = None
+        self.cycles_since_refresh = 0
+        self.cycles = 0
+        self.skipped = 0
+
+    def _prepare(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, self.small_size, interpolation=cv2.INTER_AREA)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def dirty_slots(self, small):
+        changed = cv2.absdiff(small, self.reference) > self.pixel_threshold
+        counts = np.bincount(self.labels[changed & self.inside], minlength=self.num_slots)
+        return np.flatnonzero(counts / self.slot_pixels > self.dirty_fraction)
+
+    def check(self, frame):
+        # Returns (run_inference, dirty slot indices); when it returns True
+        # the frame becomes the new reference
+        self.cycles += 1
+        small = self._prepare(frame)
+
+        if self.reference is None or self.cycles_since_refresh + 1 >= self.refresh_every:
+            dirty = np.arange(self.num_slots)
+        else:
+            dirty = self.dirty_slots(small)
+
+        if dirty.size == 0:
+            self.skipped += 1
+            self.cycles_since_refresh += 1
+            return False, dirty
+
+        self.reference = small
+        self.cycles_since_refresh = 0
+        return True, dirty
+
+    def stats(self):
+        return {
+            "cycles": self.cycles,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.skipped / self.cycles, 3) if self.cycles else 0.0,
+        }
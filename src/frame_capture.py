@@ -0,0 +1,220 @@
+import logging
+import random
+import threading
+import time
+import cv2
+from prometheus_client import Counter, Gauge, Histogram
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+from observability import FAST_BUCKETS
+
+FRAME_DECODE_SECONDS = Histogram(
+    "parkease_frame_decode_seconds", "Frame retrieve and resize time", ["camera"], buckets=FAST_BUCKETS
+)
+
+FRAME_AGE = Gauge("parkease_capture_frame_age_seconds", "Seconds since the last grabbed frame", ["camera"])
+STREAM_RECONNECTS = Counter("parkease_stream_reconnects_total", "Capture reopens", ["camera", "reason"])
+
+GRAB_RETRY_DELAY = 0.05  # seconds between failed grabs
+REOPEN_AFTER_FAILURES = 20  # consecutive failed grabs before the stream is reopened
+MIN_REOPEN_BACKOFF = 0.5  # seconds
+MAX_REOPEN_BACKOFF = 30.0  # seconds
+
+logger = logging.getLogger(__name__)
+
+LIVE_PREFIXES = ("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://")
+
+
+def is_live_source(source):
+    return isinstance(source, int) or str(source).isdigit() or str(source).lower().startswith(LIVE_PREFIXES)
+
+
+class LatestFrameCapture:
+    """Drains a cv2.VideoCapture on its own thread into a single-slot buffer.
+
+    The thread keeps calling grab() so the decoder never falls behind a live
+    stream, and only retrieve()s (and resizes) a frame when a consumer has
+    asked for one, so skipped frames are never converted. `read` always
+    returns a frame grabbed after the call, i.e. the freshest one available.
+    Recorded files are paced at their native FPS and looped at EOF.
+
+    A stream that fails to open or keeps failing to grab is reopened with
+    exponential backoff; `reconnecting` is set meanwhile. `restart` abandons a reader thread stuck inside
+    grab() (a hung RTSP connection) for a fresh one with a new capture; the
+    old thread releases its capture whenever grab() returns.
+    """
+
+    def __init__(self, source, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), loop_file=True, name="camera"):
+        self.source = source
+        self.name = name
+        self._decode_seconds = FRAME_DECODE_SECONDS.labels(camera=name)
+        self.frame_size = frame_size
+        self.loop_file = loop_file
+        self.is_live = is_live_source(source)
+        self.cap = cv2.VideoCapture(source)
+        fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0
+        self.frame_interval = 1.0 / fps if fps and not self.is_live else 0.0
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._frame_time = 0.0
+        self._frame_id = 0
+        self._wanted = False
+        self._stopped = threading.Event()
+        self._thread = None
+        self._generation = 0
+        self._backoff = MIN_REOPEN_BACKOFF
+        self.reconnecting = False
+        self.last_grab_time = None
+
+        self.grabbed = 0
+        self.retrieved = 0
+        self.failures = 0
+        self.reconnects = 0
+        self._started_at = None
+        FRAME_AGE.labels(camera=name).set_function(self.frame_age)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def start(self):
+        self._started_at = self.last_grab_time = time.time()
+        self._spawn(self.cap)
+        return self
+
+    def _spawn(self, cap):
+        self._generation += 1
+        self._thread = threading.Thread(target=self._run, args=(self._generation, cap),
+                                        name=f"frame-capture-{self.name}", daemon=True)
+        self._thread.start()
+
+    def restart(self, reason="stalled"):
+        # The new reader gets a full stall timeout before it can be restarted again
+        self.reconnects += 1
+        STREAM_RECONNECTS.labels(camera=self.name, reason=reason).inc()
+        self.last_grab_time = time.time()
+        self._backoff = MIN_REOPEN_BACKOFF
+        self._spawn(None)
+
+    def frame_age(self):
+        # Seconds since the last successful grab
+        return time.time() - self.last_grab_time if self.last_grab_time else 0.0
+
+    def stop(self):
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        else:
+            self.cap.release()
+
+    def _current(self, generation):
+        return generation == self._generation and not self._stopped.is_set()
+
+    def _wait_backoff(self, generation):
+        delay = self._backoff * random.uniform(0.8, 1.2)
+        self._backoff = min(self._backoff * 2, MAX_REOPEN_BACKOFF)
+        logger.warning("capture unavailable camera=%s retry_in=%.1fs", self.name, delay)
+        self._stopped.wait(delay)
+        return self._current(generation)
+
+    def _open(self, generation):
+        self.reconnecting = True
+        try:
+            while self._wait_backoff(generation):
+                cap = cv2.VideoCapture(self.source)
+                if cap.isOpened():
+                    logger.info("capture reopened camera=%s", self.name)
+                    return cap
+                cap.release()
+            return None
+        finally:
+            if self._current(generation):
+                self.reconnecting = False
+
+    def _run(self, generation, cap):
+        next_due = time.monotonic()
+        consecutive = 0
+        try:
+            while self._current(generation):
+                if cap is None or not cap.isOpened():
+                    if cap is not None:
+                        cap.release()
+                    cap = self._open(generation)
+                    if cap is None:
+                        break
+                    self.cap = cap
+
+                if not cap.grab():
+                    self.failures += 1
+                    consecutive += 1
+                    if not self.is_live and self.loop_file and consecutive == 1:
+                        # End of a recorded file: loop it
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    elif consecutive >= REOPEN_AFTER_FAILURES:
+                        self.reconnects += 1
+                        STREAM_RECONNECTS.labels(camera=self.name, reason="read_failures").inc()
+                        cap.release()
+                        cap, consecutive = None, 0
+                    else:
+                        self._stopped.wait(GRAB_RETRY_DELAY)
+                    continue
+
+                consecutive = 0
+                self._backoff = MIN_REOPEN_BACKOFF
+                grab_time = self.last_grab_time = time.time()
+                self.grabbed += 1
+                if not self._current(generation):
+                    break
+                next_due = self._deliver(cap, grab_time, next_due)
+        finally:
+            if cap is not None:
+                cap.release()
+
+    def _deliver(self, cap, grab_time, next_due):
+        with self._cond:
+            wanted = self._wanted
+        if wanted:
+            decode_start = time.perf_counter()
+            ok, frame = cap.retrieve()
+            if ok and frame is not None:
+                frame = cv2.resize(frame, self.frame_size)
+                self._decode_seconds.observe(time.perf_counter() - decode_start)
+                with self._cond:
+                    self._frame, self._frame_time = frame, grab_time
+                    self._frame_id += 1
+                    self._wanted = False
+                    self._cond.notify_all()
+                self.retrieved += 1
+
+        if self.frame_interval:
+            next_due += self.frame_interval
+            delay = next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_due = time.monotonic()
+        return next_due
+
+    def read(self, timeout=2.0):
+        # Returns (frame, grab_time), or (None, None) if no new frame arrived in time
+        with self._cond:
+            last_id = self._frame_id
+            self._wanted = True
+            self._cond.wait_for(lambda: self._frame_id != last_id or self._stopped.is_set(), timeout)
+            if self._frame_id == last_id:
+                return None, None
+            return self._frame, self._frame_time
+
+    def stats(self):
+        elapsed = time.time() - self._started_at if self._started_at else 0.0
+        return {
+            "capture_fps": round(self.grabbed / elapsed, 2) if elapsed else 0.0,
+            "grabbed": self.grabbed,
+            "retrieved": self.retrieved,
+            "dropped": self.grabbed - self.retrieved,
+            "read_failures": self.failures,
+            "reconnects": self.reconnects,
+            "reconnecting": self.reconnecting,
+            "frame_age_s": round(self.frame_age(), 2),
+        }
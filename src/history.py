@@ -0,0 +1,255 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from prometheus_client import Counter, Histogram
+from slot_store import db_write_semaphore
+from observability import ERRORS, SLOW_BUCKETS
+
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 2.0))  # seconds
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", 1000))  # events, flush early
+HISTORY_MAX_BUFFER = int(os.getenv("HISTORY_MAX_BUFFER", 100000))  # events kept while the DB is down
+# Detector timestamps further ahead of the server clock are replaced by it
+HISTORY_MAX_SKEW = float(os.getenv("HISTORY_MAX_SKEW", 300))  # seconds
+
+# Rollup buckets, finest first; each is a multiple of the one before
+ROLLUP_BUCKETS = {"5m": 300, "1h": 3600}
+
+HISTORY_WRITE_SECONDS = Histogram("parkease_history_write_seconds", "Event or rollup batch write time",
+                                  ["kind"], buckets=SLOW_BUCKETS)
+EVENTS_WRITTEN = Counter("parkease_history_events_written_total", "Slot transition events persisted")
+EVENTS_DROPPED = Counter("parkease_history_events_dropped_total", "Events dropped on buffer overflow")
+ROLLUP_ROWS = Counter("parkease_history_rollup_rows_total", "Rollup rows written", ["level"])
+
+logger = logging.getLogger(__name__)
+
+
+def to_datetime(seconds: float) -> datetime:
+    return datetime.fromtimestamp(seconds, timezone.utc)
+
+
+def bucket_start(seconds: float, size: int) -> float:
+    return seconds // size * size
+
+
+class OccupancyHistory:
+    """Appends slot transitions to SlotEvent and rolls them up into buckets.
+
+    `record` only appends to memory; a background task inserts the events in
+    batches with create_many and, once a 5-minute bucket has ended, adds each
+    slot's occupied and observed seconds and transition count to its
+    SlotOccupancyRollup rows (5m and the 1h containing it) and the lot's
+    LotOccupancyRollup rows. Rollup rows are upserted with increments, so a
+    bucket cut short by a restart is completed by the next process.
+    Reporting reads only the rollups.
+    """
+
+    def __init__(self, prisma, flush_interval=HISTORY_FLUSH_INTERVAL,
+                 max_pending=HISTORY_MAX_PENDING, max_buffer=HISTORY_MAX_BUFFER):
+        self.prisma = prisma
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_buffer = max_buffer
+        self.step = min(ROLLUP_BUCKETS.values())
+
+        self.events: List[Dict] = []
+        # (lot, slot) -> (status, seconds since which it is accounted for)
+        self.slots: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+        # (lot, slot, finest bucket start) -> [occupied s, observed s, transitions]
+        self.open: Dict[Tuple[str, str, float], List[float]] = {}
+        # Row increments waiting to be written: (level, lot, slot, bucket, start) -> values
+        self.rollups: Dict[Tuple, List[float]] = {}
+        # Everything before this is in closed buckets
+        self.closed_until = bucket_start(time.time(), self.step)
+        self._flush_now = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.rollup_rows = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            # Let an in-flight flush finish: its events and rows are no longer queued
+            self._stopping = True
+            self._flush_now.set()
+            await self._task
+            self._task = None
+        # Partial buckets too: the next process increments the same rows
+        self.close(time.time(), partial=True)
+        await self.flush()
+
+    def seed(self, lot_id: str, slots: Dict[str, bool]):
+        # Stored statuses, accounted for from now on; slots that never change
+        # still fill their buckets
+        now = max(time.time(), self.closed_until)
+        for slot_number, status in slots.items():
+            self.slots.setdefault((lot_id, str(slot_number)), (bool(status), now))
+
+    def record(self, lot_id: str, changed: Dict[str, bool], timestamp: Optional[float] = None):
+        if not changed:
+            return
+        now = time.time()
+        at = float(timestamp) if timestamp and float(timestamp) <= now + HISTORY_MAX_SKEW else now
+
+        for slot_number, status in changed.items():
+            self.events.append({
+                "lotId": lot_id,
+                "slotNumber": int(slot_number),
+                "status": bool(status),
+                "at": to_datetime(at),
+                "receivedAt": to_datetime(now),
+            })
+            key = (lot_id, slot_number)
+            previous = self.slots.get(key)
+            if previous is None:
+                # First report since startup: nothing to account for before it
+                self.slots[key] = (bool(status), max(at, self.closed_until))
+                continue
+            # Late or out-of-order timestamps never reach into accounted time
+            since = max(at, previous[1])
+            self._accumulate(lot_id, slot_number, previous[0], previous[1], since)
+            self._bucket(lot_id, slot_number, since)[2] += 1
+            self.slots[key] = (bool(status), since)
+        self.recorded += len(changed)
+
+        if len(self.events) > self.max_buffer:
+            overflow = len(self.events) - self.max_buffer
+            del self.events[:overflow]
+            self.dropped += overflow
+            EVENTS_DROPPED.inc(overflow)
+        if len(self.events) >= self.max_pending:
+            self._flush_now.set()
+
+    def _bucket(self, lot_id: str, slot_number: str, seconds: float) -> List[float]:
+        return self.open.setdefault((lot_id, slot_number, bucket_start(seconds, self.step)), [0.0, 0.0, 0])
+
+    def _accumulate(self, lot_id: str, slot_number: str, status: bool, start: float, end: float):
+        # Split [start, end) over the finest buckets; status True = free
+        while start < end:
+            stop = min(bucket_start(start, self.step) + self.step, end)
+            bucket = self._bucket(lot_id, slot_number, start)
+            bucket[1] += stop - start
+            if not status:
+                bucket[0] += stop - start
+            start = stop
+
+    def close(self, now: float, partial: bool = False):
+        # Moves ended buckets (all open ones with partial=True) to the write queue
+        until = now if partial else bucket_start(now, self.step)
+        if until <= self.closed_until:
+            return
+        for key, (status, since) in self.slots.items():
+            if since < until:
+                self._accumulate(key[0], key[1], status, since, until)
+                self.slots[key] = (status, until)
+        self.closed_until = until
+
+        for key in [key for key in self.open if partial or key[2] + self.step <= until]:
+            lot_id, slot_number, start = key
+            values = self.open.pop(key)
+            if not values[1] and not values[2]:
+                continue
+            for name, size in ROLLUP_BUCKETS.items():
+                self._add_rollup(("slot", lot_id, int(slot_number), name, bucket_start(start, size)), values)
+                self._add_rollup(("lot", lot_id, None, name, bucket_start(start, size)), values)
+
+    def _add_rollup(self, key: Tuple, values: List[float]):
+        total = self.rollups.setdefault(key, [0.0, 0.0, 0])
+        for i, value in enumerate(values):
+            total[i] += value
+
+    async def flush(self):
+        if self.events:
+            await self._write_events()
+        if self.rollups:
+            await self._write_rollups()
+
+    async def _write_events(self):
+        batch, self.events = self.events, []
+        try:
+            start = time.perf_counter()
+            while batch:
+                chunk = batch[:self.max_pending]
+                async with db_write_semaphore:
+                    await self.prisma.slotevent.create_many(data=chunk)
+                self.written += len(chunk)
+                EVENTS_WRITTEN.inc(len(chunk))
+                batch = batch[len(chunk):]
+            HISTORY_WRITE_SECONDS.labels(kind="events").observe(time.perf_counter() - start)
+        except Exception as e:
+            self.errors += 1
+            ERRORS.labels(component="history").inc()
+            logger.warning("event write failed events=%d error=%s", len(batch), e)
+            # Unwritten events go back ahead of newer ones, within the buffer bound
+            self.events = (batch + self.events)[-self.max_buffer:]
+
+    async def _upsert_rollup(self, key, values):
+        level, lot_id, slot_number, name, start = key
+        where = {"lotId": lot_id, "bucket": name, "start": to_datetime(start)}
+        increments = {
+            "occupiedSeconds": {"increment": values[0]},
+            "observedSeconds": {"increment": values[1]},
+            "transitions": {"increment": int(values[2])},
+        }
+        create = dict(where, occupiedSeconds=values[0], observedSeconds=values[1], transitions=int(values[2]))
+        async with db_write_semaphore:
+            if level == "slot":
+                where["slotNumber"] = create["slotNumber"] = slot_number
+                await self.prisma.slotoccupancyrollup.upsert(
+                    where={"lotId_slotNumber_bucket_start": where}, data={"create": create, "update": increments}
+                )
+            else:
+                await self.prisma.lotoccupancyrollup.upsert(
+                    where={"lotId_bucket_start": where}, data={"create": create, "update": increments}
+                )
+        ROLLUP_ROWS.labels(level=level).inc()
+
+    async def _write_rollups(self):
+        rows, self.rollups = self.rollups, {}
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self._upsert_rollup(key, values) for key, values in rows.items()), return_exceptions=True
+        )
+        HISTORY_WRITE_SECONDS.labels(kind="rollups").observe(time.perf_counter() - start)
+
+        errors = [(key, result) for key, result in zip(rows, results) if isinstance(result, Exception)]
+        self.rollup_rows += len(rows) - len(errors)
+        if errors:
+            self.errors += 1
+            ERRORS.labels(component="history").inc()
+            logger.warning("rollup write failed rows=%d error=%s", len(errors), errors[0][1])
+            # Only the failed rows are retried, so nothing is incremented twice
+            for key, _ in errors:
+                self._add_rollup(key, rows[key])
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            self.close(time.time())
+            await self.flush()
+
+    def stats(self):
+        return {
+            "pending_events": len(self.events),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "open_buckets": len(self.open),
+            "pending_rollup_rows": len(self.rollups),
+            "rollup_rows": self.rollup_rows,
+            "errors": self.errors,
+        }
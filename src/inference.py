@@ -0,0 +1,116 @@
+import logging
+import os
+import shutil
+import time
+import numpy as np
+from prometheus_client import Histogram
+from observability import SLOW_BUCKETS
+
+FULL_FRAME = "full"
+ROI_TILES = "roi"
+
+PYTORCH = "pytorch"
+ONNX = "onnx"
+OPENVINO = "openvino"
+
+DEFAULT_WEIGHTS = "yolo11m.pt"
+DEFAULT_CONFIDENCE = 0.7
+
+PREDICT_SECONDS = Histogram(
+    "parkease_predict_seconds", "model.predict time per call, one call per batch", buckets=SLOW_BUCKETS
+)
+PREDICT_IMAGES = Histogram(
+    "parkease_predict_images", "Images (frames or tiles) per model.predict call", buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+
+logger = logging.getLogger(__name__)
+
+
+def exported_model_path(weights, backend, int8=False):
+    stem = os.path.splitext(weights)[0] + ("-int8" if int8 else "")
+    if backend == ONNX:
+        return f"{stem}.onnx"
+    if backend == OPENVINO:
+        return f"{stem}_openvino_model"
+    raise ValueError(f"Unknown inference backend: {backend}")
+
+
+def export_model(weights, backend, int8=False):
+    # One-off export, cached next to the weights. Dynamic shapes keep
+    # batching across cameras and the smaller ROI imgsz working.
+    from ultralytics import YOLO
+
+    target = exported_model_path(weights, backend, int8)
+    model = YOLO(weights)
+    if backend == ONNX:
+        exported = model.export(format="onnx", dynamic=True, simplify=True)
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported, target, weight_type=QuantType.QUInt8)
+            return target
+    else:
+        # OpenVINO INT8 is post-training quantization calibrated by the exporter
+        exported = model.export(format="openvino", dynamic=True, int8=int8)
+
+    if os.path.abspath(exported) != os.path.abspath(target):
+        shutil.move(exported, target)
+    return target
+
+
+def load_model(weights=DEFAULT_WEIGHTS, backend=PYTORCH, int8=False):
+    # ultralytics runs .onnx files through ONNX Runtime and *_openvino_model
+    # directories through OpenVINO, with the same Results output as PyTorch,
+    # so everything downstream of predict is unchanged.
+    from ultralytics import YOLO
+
+    if backend == PYTORCH:
+        return YOLO(weights)
+
+    path = exported_model_path(weights, backend, int8)
+    if not os.path.exists(path):
+        logger.info("exporting model weights=%s backend=%s int8=%s path=%s", weights, backend, int8, path)
+        path = export_model(weights, backend, int8)
+    return YOLO(path, task="detect")
+
+
+def detect_batch(model, frames, tilers=None, conf=DEFAULT_CONFIDENCE, **predict_kwargs):
+    # Runs the model over several frames and returns one (N, 6) array of
+    # x1, y1, x2, y2, conf, class per frame, in frame coordinates. Frames
+    # with a tiler are predicted as ROI tiles; inputs sharing an imgsz go
+    # through one batched predict call.
+    tilers = tilers or [None] * len(frames)
+    jobs = {}
+    for index, (frame, tiler) in enumerate(zip(frames, tilers)):
+        if tiler is None:
+            jobs.setdefault(None, []).append((index, None, frame))
+        else:
+            for tile, crop in enumerate(tiler.crops(frame)):
+                jobs.setdefault(tiler.imgsz, []).append((index, tile, crop))
+
+    outputs = [[] for _ in frames]
+    for imgsz, batch in jobs.items():
+        kwargs = dict(predict_kwargs, conf=conf, verbose=False)
+        if imgsz is not None:
+            kwargs["imgsz"] = imgsz
+        start = time.perf_counter()
+        results = model.predict([image for _, _, image in batch], **kwargs)
+        PREDICT_SECONDS.observe(time.perf_counter() - start)
+        PREDICT_IMAGES.observe(len(batch))
+        for (index, tile, _), result in zip(batch, results):
+            outputs[index].append((tile, result.boxes.data.cpu().numpy()))
+
+    detections = []
+    for index, tiler in enumerate(tilers):
+        if tiler is None:
+            found = [boxes for _, boxes in outputs[index]]
+            detections.append(found[0] if found else np.zeros((0, 6)))
+        else:
+            per_tile = [np.zeros((0, 6))] * len(tiler.tiles)
+            for tile, boxes in outputs[index]:
+                per_tile[tile] = boxes
+            detections.append(tiler.merge(per_tile))
+    return detections
+
+
+def detect(model, frame, tiler=None, conf=DEFAULT_CONFIDENCE, **predict_kwargs):
+    return detect_batch(model, [frame], [tiler], conf=conf, **predict_kwargs)[0]
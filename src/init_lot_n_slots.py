@@ -1,7 +1,7 @@
 import os 
-import pickle 
 import requests
 from dotenv import load_dotenv
+from slot_layout import SlotLayout, DEFAULT_LAYOUT_PATH
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
@@ -20,30 +20,43 @@ if not WEBSOCKET_HOST or not WEBSOCKET_PORT:
     raise EnvironmentError("Either WEBSOCKET_HOST or WEBSOCKET_PORT environment variable is not set!")
 
 try:
-    with open("parkease", "rb") as f:
-        data = pickle.load(f)
-        polylines, area_names = data["polylines"], data["area_names"]
-        PARKING_SLOTS = len(polylines)
+    layout = SlotLayout.load(DEFAULT_LAYOUT_PATH)
+    area_names = layout.area_names
+    PARKING_SLOTS = layout.num_slots
+    # Per-slot coordinates from the layout metadata, when it has them
+    if PARKING_SLOTS and all("location" in meta for meta in layout.metadata):
+        locations = [meta["location"] for meta in layout.metadata]
 except FileNotFoundError:
-    print("Error: 'parkease' file not found. Run 'mark_slots.py' first.")
+    print(f"Error: '{DEFAULT_LAYOUT_PATH}' file not found. Run 'mark_slots.py' first.")
     exit(1)
 
-if not PARKING_LOT_ID:
-    try:
-        API_URL = f"http://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/create_parking_lot"
+if not PARKING_SLOTS:
+    print("PARKING_SLOTS variable doesn't exist! Run mark_slots.py again.")
+    exit(1)
+
+# Lot and slots in one call. Re-running is safe: with PARKING_LOT_ID set the
+# lot is reused and only missing or moved slots are written.
+try:
+    API_URL = f"http://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/setup_parking_lot"
+
+    payload = {
+        "lot_id": PARKING_LOT_ID or layout.lot_id,
+        "name": "Awesome Parking Lot",
+        "location": "New Jersey, USA",
+        "slot_numbers": area_names,
+        "locations": locations
+    }
+    headers = {"Content-Type": "application/json"}
 
-        payload = {
-            "name": "Awesome Parking Lot",
-            "location": "New Jersey, USA",
-            "total_slots": int(PARKING_SLOTS)
-        }
-        headers = {"Content-Type": "application/json"}
+    response = requests.post(API_URL, json=payload, headers=headers)
 
-        response = requests.post(API_URL, json=payload, headers=headers)
+    if response.status_code == 200:
+        result = response.json()
+        print(f"Parking lot {result['id']} ({'created' if result['lot_created'] else 'existing'}): "
+              f"{result['created']} slots created, {result['updated']} updated, {result['unchanged']} unchanged")
 
-        if response.status_code == 201:
-            PARKING_LOT_ID = response.json().get("id")
-            print(f"Created Parking Lot with ID: {PARKING_LOT_ID}")
+        if result["lot_created"]:
+            PARKING_LOT_ID = result["id"]
 
             ## For Local:
             # with open(dotenv_path, "a") as env_file:
@@ -58,32 +71,7 @@ if not PARKING_LOT_ID:
             ##
 
             print(f"Added PARKING_LOT_ID to /etc/environment: {PARKING_LOT_ID}")
-        else:
-            print(f"Failed to create parking lot: {response.status_code} - {response.text}")
-    except Exception as e:
-        print("Some error occurred while creating the parking lot:", str(e))
-
-if PARKING_SLOTS:
-    try:
-        API_URL = f"http://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/create_parking_slots"
-
-        payload = {
-            "num_parking_slots": int(PARKING_SLOTS),
-            "parking_lot_id": PARKING_LOT_ID,
-            "slot_numbers": area_names,
-            "locations": locations
-        }
-        headers = {"Content-Type": "application/json"}
-
-        response = requests.post(API_URL, json=payload, headers=headers)
-
-        if response.status_code == 200:
-            slots = response.json().get("slots")
-            print("Slots created successfully!")
-            print(slots)
-        else:
-            print(f"Failed to create the parking slots: {response.status_code} - {response.text}")
-    except Exception as e:
-        print("Some error occurred while creating the parking slots:", str(e))
-else:
-    print("PARKING_SLOTS variable doesn't exist! Run mark_slots.py again.")
+    else:
+        print(f"Failed to set up the parking lot: {response.status_code} - {response.text}")
+except Exception as e:
+    print("Some error occurred while setting up the parking lot:", str(e))
@@ -1,9 +1,11 @@
 import cv2 
 import numpy as np 
 import cvzone 
-import pickle 
 import os 
+import struct
 from dotenv import load_dotenv 
+from occupancy import DEFAULT_COVERAGE_THRESHOLD
+from slot_layout import SlotLayout, DEFAULT_LAYOUT_PATH, LEGACY_LAYOUT_PATH
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
@@ -16,12 +18,22 @@ cap = cv2.VideoCapture(CAMERA_STREAM_URL)
 
 drawing=False
 area_names=[]
+thresholds=[]
+metadata=[]
 try:
-    with open("parkease","rb") as f:
-        data = pickle.load(f)
-        polylines, area_names = data['polylines'], data['area_names']
-except:
+    layout = SlotLayout.load(DEFAULT_LAYOUT_PATH, mmap=False)
+    polylines = [np.array(polyline) for polyline in layout.polylines]
+    area_names, thresholds, metadata = layout.area_names, layout.thresholds, layout.metadata
+except FileNotFoundError:
+    if os.path.exists(LEGACY_LAYOUT_PATH):
+        # Starting empty here would save over the slots kept in the old file
+        print(f"Found an old '{LEGACY_LAYOUT_PATH}' file, convert it first: python migrate_layout.py {LEGACY_LAYOUT_PATH} {DEFAULT_LAYOUT_PATH}")
+        raise SystemExit(1)
     polylines=[]
+except (ValueError, KeyError, struct.error) as e:
+    print(f"Could not read '{DEFAULT_LAYOUT_PATH}': {e}")
+    print(f"If it is a pickled layout from an older version, convert it first: python migrate_layout.py {DEFAULT_LAYOUT_PATH} {DEFAULT_LAYOUT_PATH}")
+    raise SystemExit(1)
 
 points=[]
 current_name=""
@@ -46,6 +58,8 @@ def draw(event,x,y,flags,param):
         if current_name:
             area_names.append(current_name)
             polylines.append(np.array(points,np.int32))
+            thresholds.append(DEFAULT_COVERAGE_THRESHOLD)
+            metadata.append({})
     
 
 while True:
@@ -62,10 +76,10 @@ while True:
     cv2.setMouseCallback('FRAME',draw)
     key = cv2.waitKey(1) & 0xFF
     if key==ord('s'):
-        with open("parkease","wb") as f:
-            data = {'polylines': polylines, 'area_names': area_names}
-            pickle.dump(data,f)
-            break
+        # Drag strokes record every mouse move; simplified outlines are saved
+        layout = SlotLayout(polylines, area_names, thresholds, lot_id=os.getenv("PARKING_LOT_ID"), metadata=metadata)
+        layout.simplified().save(DEFAULT_LAYOUT_PATH)
+        break
     elif key==ord('q'):
         break
 
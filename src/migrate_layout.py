@@ -0,0 +1,40 @@
+import argparse
+import os
+import pickle
+from dotenv import load_dotenv
+from slot_layout import SlotLayout, DEFAULT_LAYOUT_PATH, LEGACY_LAYOUT_PATH, DEFAULT_SIMPLIFY_EPSILON, is_layout_file
+
+# One-shot conversion of a pickled 'parkease' file from older mark_slots.py
+# versions into the versioned layout format. Only run it on files you made:
+# unpickling executes whatever the file contains.
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pickled slot layout to the versioned layout format")
+    parser.add_argument("source", nargs="?", default=LEGACY_LAYOUT_PATH)
+    parser.add_argument("target", nargs="?", default=DEFAULT_LAYOUT_PATH)
+    parser.add_argument("--lot-id", default=os.getenv("PARKING_LOT_ID"))
+    parser.add_argument("--epsilon", type=float, default=DEFAULT_SIMPLIFY_EPSILON,
+                        help="polygon simplification tolerance in pixels, 0 keeps every vertex")
+    args = parser.parse_args()
+
+    if is_layout_file(args.source):
+        print(f"{args.source} is already in the layout format.")
+        return
+
+    with open(args.source, "rb") as f:
+        data = pickle.load(f)
+    layout = SlotLayout(data["polylines"], data["area_names"], data.get("thresholds"), lot_id=args.lot_id)
+    simplified = layout.simplified(args.epsilon)
+    simplified.save(args.target)
+
+    print(f"Wrote {args.target}: {simplified.num_slots} slots, "
+          f"{len(layout.vertices)} -> {len(simplified.vertices)} vertices, "
+          f"{os.path.getsize(args.source)} -> {os.path.getsize(args.target)} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import os
+import json
+import asyncio
+import logging
+import time
+from dotenv import load_dotenv
+from occupancy import CENTROID_MODE
+from slot_tracker import DEFAULT_CONFIRM_CYCLES
+from camera_pipeline import CameraPipeline, load_layout
+from frame_capture import LatestFrameCapture
+from inference import detect_batch, load_model, FULL_FRAME, PYTORCH, DEFAULT_WEIGHTS
+from change_gate import DEFAULT_REFRESH_EVERY
+from scheduler import AdaptiveScheduler, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL, DEFAULT_CPU_TARGET
+from observability import setup_logging, start_metrics_listener
+from slot_layout import DEFAULT_LAYOUT_PATH
+from supervisor import DetectorSupervisor, DEFAULT_STALL_TIMEOUT
+
+# One detector process for many cameras: a single shared YOLO model and one
+# batched model.predict over the latest frame of every camera per cycle.
+#
+# cameras.json:
+#   [{"name": "north", "stream_url": "rtsp://...", "layout": "north.layout", "lot_id": "..."}, ...]
+
+dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
+load_dotenv(dotenv_path)
+
+WEBSOCKET_HOST = os.getenv("WEBSOCKET_HOST")
+WEBSOCKET_PORT = os.getenv("WEBSOCKET_PORT")
+CAMERAS_CONFIG = os.getenv("CAMERAS_CONFIG", "cameras.json")
+OCCUPANCY_MODE = os.getenv("OCCUPANCY_MODE", CENTROID_MODE)  # "centroid" or "coverage"
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", FULL_FRAME)  # "full" or "roi"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", PYTORCH)  # "pytorch", "onnx" or "openvino"
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "0") == "1"  # quantized export for onnx/openvino
+CHANGE_GATE = os.getenv("CHANGE_GATE", "0") == "1"  # skip YOLO while the slots show no change
+CHANGE_GATE_REFRESH = int(os.getenv("CHANGE_GATE_REFRESH", DEFAULT_REFRESH_EVERY))  # forced refresh, cycles
+YOLO_DEVICE = os.getenv("YOLO_DEVICE", "cpu")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))  # Prometheus /metrics listener, 0 to disable
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")  # durable outgoing message spool, "" to disable
+SPOOL_MAX_MB = float(os.getenv("SPOOL_MAX_MB", 64))  # oldest messages are dropped beyond this
+STALL_TIMEOUT = float(os.getenv("STALL_TIMEOUT", DEFAULT_STALL_TIMEOUT))  # restart a stream with no frames this long
+LAYOUT_RELOAD = os.getenv("LAYOUT_RELOAD", "1") == "1"  # hot-swap a camera's layout when its file changes
+
+setup_logging()
+logger = logging.getLogger("multi_camera")
+
+if not WEBSOCKET_HOST or not WEBSOCKET_PORT:
+    raise EnvironmentError("Either WEBSOCKET_HOST or WEBSOCKET_PORT environment variable is not set!")
+
+PROCESS_INTERVAL = 4.0  # initial YOLO processing interval in seconds
+PROCESS_INTERVAL_MIN = float(os.getenv("PROCESS_INTERVAL_MIN", DEFAULT_MIN_INTERVAL))
+PROCESS_INTERVAL_MAX = float(os.getenv("PROCESS_INTERVAL_MAX", DEFAULT_MAX_INTERVAL))
+CPU_TARGET = float(os.getenv("CPU_TARGET", DEFAULT_CPU_TARGET))  # share of the node's cores
+SLOT_CONFIRM_CYCLES = int(os.getenv("SLOT_CONFIRM_CYCLES", DEFAULT_CONFIRM_CYCLES))
+
+
+class Camera:
+    def __init__(self, config, class_list):
+        self.name = config["name"]
+        self.layout_path = config.get("layout", DEFAULT_LAYOUT_PATH)
+        url = f"ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/update_slot_status/{config['lot_id']}"
+        self.pipeline = CameraPipeline(
+            self.name, self.layout_path, class_list, url,
+            occupancy_mode=OCCUPANCY_MODE, confirm_cycles=SLOT_CONFIRM_CYCLES, inference_mode=INFERENCE_MODE,
+            change_gate=CHANGE_GATE, refresh_every=CHANGE_GATE_REFRESH,
+            spool_dir=SPOOL_DIR, spool_max_bytes=int(SPOOL_MAX_MB * (1 << 20)), layout_mmap=not LAYOUT_RELOAD
+        )
+        self.capture = LatestFrameCapture(config["stream_url"], name=self.name)
+
+
+def load_cameras(path, class_list):
+    with open(path, "r") as f:
+        configs = json.load(f)
+    cameras = [Camera(config, class_list) for config in configs]
+    for camera in cameras:
+        # Live streams that are down at startup keep reconnecting in the background
+        if not camera.capture.isOpened() and not camera.capture.is_live:
+            raise RuntimeError(f"Failed to open video capture for camera {camera.name}")
+    return cameras
+
+
+async def run_cycle(model, cameras, now):
+    reads = await asyncio.gather(*(asyncio.to_thread(camera.capture.read) for camera in cameras))
+    fresh = [(camera, frame) for camera, (frame, _) in zip(cameras, reads) if frame is not None]
+    due = [(camera, frame) for camera, frame in fresh if camera.pipeline.needs_inference(frame)]
+
+    # One batched forward pass for every camera whose slots changed
+    start = time.perf_counter()
+    detections = []
+    if due:
+        detections = await asyncio.to_thread(
+            detect_batch, model, [frame for _, frame in due],
+            [camera.pipeline.tiler for camera, _ in due], device=YOLO_DEVICE
+        )
+    latency = time.perf_counter() - start
+
+    results = {camera.name: camera_detections for (camera, _), camera_detections in zip(due, detections)}
+    for camera, _ in fresh:
+        message = camera.pipeline.update(results.get(camera.name), now)
+        if message:
+            logger.debug("queued camera=%s type=%s seq=%d slots=%d",
+                         camera.name, message["type"], message["seq"], len(message["slots"]))
+    return len(due), latency, sum(camera.pipeline.activity for camera, _ in fresh)
+
+
+async def main():
+    try:
+        with open("coco.txt", "r") as my_file:
+            class_list = my_file.read().split("\n")
+        model = load_model(DEFAULT_WEIGHTS, INFERENCE_BACKEND, INFERENCE_INT8)
+    except Exception as e:
+        logger.error("failed to load YOLO model or class list: %s", e)
+        exit(1)
+
+    cameras = load_cameras(CAMERAS_CONFIG, class_list)
+    supervisor = DetectorSupervisor(stall_timeout=STALL_TIMEOUT)
+    for camera in cameras:
+        camera.pipeline.publisher.start()
+        camera.capture.start()
+        supervisor.watch_capture(camera.capture)
+        if LAYOUT_RELOAD:
+            supervisor.watch_layout(camera.name, camera.layout_path,
+                                    lambda path: load_layout(path, mmap=False), camera.pipeline.swap_layout)
+    supervisor.start()
+    start_metrics_listener(METRICS_PORT)
+    logger.info("serving cameras=%d with one shared model", len(cameras))
+
+    # One cadence for the whole node: any camera's activity speeds it up,
+    # the batched predict latency and process CPU bound it from below
+    scheduler = AdaptiveScheduler(PROCESS_INTERVAL, PROCESS_INTERVAL_MIN, PROCESS_INTERVAL_MAX, CPU_TARGET)
+    next_cycle = time.time()
+    try:
+        while True:
+            await asyncio.sleep(max(0.0, next_cycle - time.time()))
+            cpu_start = time.process_time()
+            inferred, latency, activity = await run_cycle(model, cameras, time.time())
+            interval, reason = scheduler.record(activity, latency if inferred else None)
+            next_cycle = max(next_cycle + interval, time.time())
+            logger.debug("batched inference cameras=%d/%d latency_ms=%.0f cycle_cpu_ms=%.0f",
+                         inferred, len(cameras), latency * 1000, (time.process_time() - cpu_start) * 1000)
+            logger.info("cadence interval=%.2fs reason=%s stats=%s", interval, reason, scheduler.stats())
+    finally:
+        await supervisor.stop()
+        for camera in cameras:
+            camera.capture.stop()
+            await camera.pipeline.publisher.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import logging
+import os
+from prometheus_client import Counter, start_http_server
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s %(message)s"
+
+# Latency buckets in seconds: per-frame stages are sub-millisecond to tens of
+# milliseconds, model and DB calls up to seconds
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+SLOW_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Each process only registers the metrics of the modules it imports; this
+# counter is shared by all of them
+ERRORS = Counter("parkease_errors_total", "Errors by component", ["component"])
+
+
+def setup_logging(level=LOG_LEVEL):
+    # Messages are key=value pairs after a short event name, so they stay grep- and parse-friendly
+    logging.basicConfig(level=level.upper(), format=LOG_FORMAT)
+
+
+def start_metrics_listener(port):
+    # Prometheus text format on http://0.0.0.0:<port>/metrics; port 0 disables it
+    if port:
+        start_http_server(port)
+        logging.getLogger(__name__).info("metrics listener port=%d", port)
@@ -0,0 +1,117 @@
+import cv2
+import numpy as np
+
+FRAME_WIDTH = 1020
+FRAME_HEIGHT = 500
+
+CENTROID_MODE = "centroid"
+COVERAGE_MODE = "coverage"
+DEFAULT_COVERAGE_THRESHOLD = 0.5
+
+
+def rasterize_slots(polylines, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), dtype=np.int32):
+    # Label mask: slot index per pixel, -1 outside every slot. Pixels shared
+    # by overlapping polylines belong to the later slot.
+    width, height = frame_size
+    labels = np.full((height, width), -1, dtype=dtype)
+    for i, polyline in enumerate(polylines):
+        cv2.fillPoly(labels, [np.asarray(polyline, np.int32).reshape(-1, 1, 2)], i)
+    return labels
+
+
+class OccupancyEngine:
+    """Resolves YOLO detections to filled/free slots with one NumPy lookup per cycle.
+
+    The slot polylines are rasterized once into a label mask (slot index per
+    pixel, -1 outside every slot), so a detection centroid maps to its slot by
+    indexing the mask instead of calling cv2.pointPolygonTest per slot.
+
+    In coverage mode a slot is filled when the union of car boxes covers at
+    least its threshold fraction of the slot area, which copes with angled
+    cameras and cars straddling two slots.
+    """
+
+    def __init__(self, polylines, area_names, class_list, target_class="car",
+                 frame_size=(FRAME_WIDTH, FRAME_HEIGHT), mode=CENTROID_MODE, thresholds=None, labels=None):
+        if len(polylines) != len(area_names):
+            raise ValueError("polylines and area_names must have the same length")
+        if mode not in (CENTROID_MODE, COVERAGE_MODE):
+            raise ValueError(f"Unknown occupancy mode: {mode}")
+
+        self.area_names = list(area_names)
+        self.width, self.height = frame_size
+        self.mode = mode
+
+        if thresholds is None:
+            thresholds = [DEFAULT_COVERAGE_THRESHOLD] * len(self.area_names)
+        if len(thresholds) != len(self.area_names):
+            raise ValueError("thresholds and area_names must have the same length")
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+
+        # Same matching rule as before: any class whose name contains the target
+        self.target_class_ids = np.array(
+            [i for i, name in enumerate(class_list) if target_class in name], dtype=np.int64
+        )
+
+        # A saved layout carries its label mask, so nothing is rasterized at startup
+        if labels is None:
+            labels = rasterize_slots(polylines, frame_size)
+        elif labels.shape != (self.height, self.width):
+            raise ValueError(f"Label mask is {labels.shape[::-1]}, expected {frame_size}")
+        self.labels = labels
+
+        inside = self.labels[self.labels >= 0]
+        self.slot_areas = np.bincount(inside, minlength=self.num_slots)
+        self._covered = np.zeros((self.height, self.width), dtype=bool)
+
+    @property
+    def num_slots(self):
+        return len(self.area_names)
+
+    def car_boxes(self, detections):
+        # detections: (N, 6) array of x1, y1, x2, y2, conf, class
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6)
+        cars = detections[np.isin(detections[:, 5].astype(np.int64), self.target_class_ids)]
+        return cars[:, :4].astype(np.int64)
+
+    def car_centroids(self, detections):
+        boxes = self.car_boxes(detections)
+        cx = (boxes[:, 0] + boxes[:, 2]) // 2
+        cy = (boxes[:, 1] + boxes[:, 3]) // 2
+        return np.stack((cx, cy), axis=1)
+
+    def coverage(self, detections):
+        boxes = self.car_boxes(detections)
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, self.width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, self.height)
+
+        # Rasterize the union of boxes so overlapping cars are not counted twice
+        covered = self._covered
+        covered[:] = False
+        for x1, y1, x2, y2 in boxes:
+            covered[y1:y2 + 1, x1:x2 + 1] = True
+
+        hits = self.labels[covered]
+        covered_areas = np.bincount(hits[hits >= 0], minlength=self.num_slots)
+        return covered_areas / np.maximum(self.slot_areas, 1)
+
+    def occupied(self, detections):
+        if self.mode == COVERAGE_MODE:
+            return self.coverage(detections) >= self.thresholds
+
+        centroids = self.car_centroids(detections)
+        cx, cy = centroids[:, 0], centroids[:, 1]
+        inside = (cx >= 0) & (cx < self.width) & (cy >= 0) & (cy < self.height)
+
+        hits = self.labels[cy[inside], cx[inside]]
+        occupied = np.zeros(self.num_slots, dtype=bool)
+        occupied[hits[hits >= 0]] = True
+        return occupied
+
+    def split(self, occupied):
+        filled_slots = {name for name, o in zip(self.area_names, occupied) if o}
+        free_slots = set(self.area_names) - filled_slots
+        return filled_slots, free_slots
+
+    def evaluate(self, detections):
+        return self.split(self.occupied(detections))
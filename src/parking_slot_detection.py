@@ -1,14 +1,19 @@
 import os 
-import cv2
-import pickle 
-import pandas as pd
-from ultralytics import YOLO
-import cvzone
-import websockets
 import asyncio
-import json
+import logging
 import time
 from dotenv import load_dotenv
+from occupancy import CENTROID_MODE
+from slot_tracker import DEFAULT_CONFIRM_CYCLES
+from camera_pipeline import CameraPipeline, load_layout
+from frame_capture import LatestFrameCapture
+from inference import detect, load_model, FULL_FRAME, PYTORCH, DEFAULT_WEIGHTS
+from change_gate import DEFAULT_REFRESH_EVERY
+from scheduler import AdaptiveScheduler, DEFAULT_MIN_INTERVAL, DEFAULT_MAX_INTERVAL, DEFAULT_CPU_TARGET
+from visualization import SlotOverlay, Visualizer, MjpegStream, FILE, MJPEG, DEFAULT_FPS, DEFAULT_MJPEG_PORT
+from observability import ERRORS, setup_logging, start_metrics_listener
+from slot_layout import DEFAULT_LAYOUT_PATH
+from supervisor import DetectorSupervisor, DEFAULT_STALL_TIMEOUT
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
@@ -16,6 +21,23 @@ load_dotenv(dotenv_path)
 WEBSOCKET_HOST = os.getenv("WEBSOCKET_HOST")
 WEBSOCKET_PORT = os.getenv("WEBSOCKET_PORT")
 CAMERA_STREAM_URL = os.getenv("CAMERA_STREAM_URL")
+OCCUPANCY_MODE = os.getenv("OCCUPANCY_MODE", CENTROID_MODE)  # "centroid" or "coverage"
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", FULL_FRAME)  # "full" or "roi"
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", PYTORCH)  # "pytorch", "onnx" or "openvino"
+INFERENCE_INT8 = os.getenv("INFERENCE_INT8", "0") == "1"  # quantized export for onnx/openvino
+CHANGE_GATE = os.getenv("CHANGE_GATE", "0") == "1"  # skip YOLO while the slots show no change
+CHANGE_GATE_REFRESH = int(os.getenv("CHANGE_GATE_REFRESH", DEFAULT_REFRESH_EVERY))  # forced refresh, cycles
+VISUALIZATION = os.getenv("VISUALIZATION", FILE)  # "off", "file" or "mjpeg"
+VISUALIZATION_FPS = float(os.getenv("VISUALIZATION_FPS", DEFAULT_FPS))
+VISUALIZATION_PORT = int(os.getenv("VISUALIZATION_PORT", DEFAULT_MJPEG_PORT))  # mjpeg only
+METRICS_PORT = int(os.getenv("METRICS_PORT", 9100))  # Prometheus /metrics listener, 0 to disable
+SPOOL_DIR = os.getenv("SPOOL_DIR", "spool")  # durable outgoing message spool, "" to disable
+SPOOL_MAX_MB = float(os.getenv("SPOOL_MAX_MB", 64))  # oldest messages are dropped beyond this
+STALL_TIMEOUT = float(os.getenv("STALL_TIMEOUT", DEFAULT_STALL_TIMEOUT))  # seconds without a frame before reconnecting
+LAYOUT_RELOAD = os.getenv("LAYOUT_RELOAD", "1") == "1"  # apply a replaced layout file without a restart
+
+setup_logging()
+logger = logging.getLogger("detector")
 
 if not WEBSOCKET_HOST or not WEBSOCKET_PORT:
     raise EnvironmentError("Either WEBSOCKET_HOST or WEBSOCKET_PORT environment variable is not set!")
@@ -23,118 +45,150 @@ if not WEBSOCKET_HOST or not WEBSOCKET_PORT:
 if not CAMERA_STREAM_URL:
     raise EnvironmentError("CAMERA_STREAM_URL environment variable is not set!")
 
-WEBSOCKET_URL = f"ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/update_slot_status"
-
-PROCESS_INTERVAL = 4.0  # YOLO processing interval in seconds
+## Docker Env:
+load_dotenv("/etc/environment")
+##
 
-async def emit_socket_event(reason, filled_slots, free_slots, current_time=0):
-    async with websockets.connect(WEBSOCKET_URL) as websocket:
-        data = {
-            "filled_slots": filled_slots,
-            "free_slots": free_slots,
-            "timestamp": int(time.time()),
-        }
-        await websocket.send(json.dumps(data))
-        print(f"Sent data: {data}")
-
-try:
-    with open("parkease", "rb") as f:
-        data = pickle.load(f)
-        polylines, area_names = data["polylines"], data["area_names"]
-except FileNotFoundError:
-    print("Error: 'parkease' file not found. Run 'mark_slots.py' first.")
-    exit(1)
+# The lot is named in the path so one server can route many detectors
+PARKING_LOT_ID = os.getenv("PARKING_LOT_ID")
+WEBSOCKET_URL = f"ws://{WEBSOCKET_HOST}:{WEBSOCKET_PORT}/update_slot_status"
+if PARKING_LOT_ID:
+    WEBSOCKET_URL = f"{WEBSOCKET_URL}/{PARKING_LOT_ID}"
+
+PROCESS_INTERVAL = 4.0  # initial YOLO processing interval in seconds
+# The interval then adapts to lot activity and inference cost within these bounds;
+# set both to the same value for a fixed cadence
+PROCESS_INTERVAL_MIN = float(os.getenv("PROCESS_INTERVAL_MIN", DEFAULT_MIN_INTERVAL))
+PROCESS_INTERVAL_MAX = float(os.getenv("PROCESS_INTERVAL_MAX", DEFAULT_MAX_INTERVAL))
+CPU_TARGET = float(os.getenv("CPU_TARGET", DEFAULT_CPU_TARGET))  # share of the node's cores
+# Consecutive YOLO cycles a slot must disagree with its state before it flips
+SLOT_CONFIRM_CYCLES = int(os.getenv("SLOT_CONFIRM_CYCLES", DEFAULT_CONFIRM_CYCLES))
 
 try:
     with open("coco.txt", "r") as my_file:
         class_list = my_file.read().split("\n")
-    model = YOLO("yolo11m.pt")
+    model = load_model(DEFAULT_WEIGHTS, INFERENCE_BACKEND, INFERENCE_INT8)
 except Exception as e:
-    print(f"Error loading YOLO model or class list: {e}")
+    logger.error("failed to load YOLO model or class list: %s", e)
+    exit(1)
+
+try:
+    pipeline = CameraPipeline(
+        "camera", DEFAULT_LAYOUT_PATH, class_list, WEBSOCKET_URL,
+        occupancy_mode=OCCUPANCY_MODE, confirm_cycles=SLOT_CONFIRM_CYCLES, inference_mode=INFERENCE_MODE,
+        change_gate=CHANGE_GATE, refresh_every=CHANGE_GATE_REFRESH,
+        spool_dir=SPOOL_DIR, spool_max_bytes=int(SPOOL_MAX_MB * (1 << 20)),
+        layout_mmap=not LAYOUT_RELOAD  # a watched file may be overwritten in place
+    )
+except FileNotFoundError:
+    logger.error("'%s' file not found, run 'mark_slots.py' (or 'migrate_layout.py' for an old 'parkease' file) first",
+                 DEFAULT_LAYOUT_PATH)
     exit(1)
 
-cap = cv2.VideoCapture(CAMERA_STREAM_URL)
+# Capture runs on its own thread; the loop below only sees the freshest frame
+capture = LatestFrameCapture(CAMERA_STREAM_URL, name="camera")
 
-if not cap.isOpened():
-    print("Failed to open video capture.")
+# A live stream that is down is retried by the capture; a missing file never appears
+if not capture.isOpened() and not capture.is_live:
+    logger.error("failed to open video capture source=%s", CAMERA_STREAM_URL)
     exit(1)
 
+# Annotated output is a debug aid: rate-limited, and skipped entirely when off
+stream = MjpegStream(port=VISUALIZATION_PORT) if VISUALIZATION == MJPEG else None
+visualizer = Visualizer(SlotOverlay(pipeline.polylines, pipeline.area_names, labels=pipeline.layout.labels), VISUALIZATION, VISUALIZATION_FPS,
+                        stream=stream)
+
+
+def apply_layout(layout):
+    pipeline.swap_layout(layout)
+    visualizer.overlay = SlotOverlay(pipeline.polylines, pipeline.area_names, labels=pipeline.layout.labels)
+
+
+# Restarts stalled streams and swaps in a replaced layout without reloading the model
+supervisor = DetectorSupervisor(stall_timeout=STALL_TIMEOUT)
+supervisor.watch_capture(capture)
+if LAYOUT_RELOAD:
+    supervisor.watch_layout("camera", DEFAULT_LAYOUT_PATH, lambda path: load_layout(path, mmap=False), apply_layout)
+
 last_emit_time = time.time()
-last_sent_slots = []
+last_sent_slots = set()
 last_yolo_time = 0
+scheduler = AdaptiveScheduler(PROCESS_INTERVAL, PROCESS_INTERVAL_MIN, PROCESS_INTERVAL_MAX, CPU_TARGET)
+MAX_CYCLE_RETRY = 30.0  # seconds, cap of the delay after consecutive failed cycles
 
 async def main():
     global last_emit_time, last_sent_slots, last_yolo_time
-    while True:
-        try:
-            ret, frame = cap.read()
-            if not ret or frame is None:
-                print("Frame is None.")
-                cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-                continue
-
-            frame = cv2.resize(frame, (1020, 500))
-            current_time = time.time()
-
-            # Run YOLO analysis only after the specified interval
-            if current_time - last_yolo_time >= PROCESS_INTERVAL:
-                last_yolo_time = current_time
-
-                results = model.predict(frame,conf=0.7)
-                detections = results[0].boxes.data
-                px = pd.DataFrame(detections).astype("float")
-
-                detected_cars = []
-                for _, row in px.iterrows():
-                    x1, y1, x2, y2, d = int(row[0]), int(row[1]), int(row[2]), int(row[3]), int(row[5])
-
-                    c = class_list[d]
-                    cx = int(x1 + x2) // 2
-                    cy = int(y1 + y2) // 2
-
-                    if "car" in c:
-                        detected_cars.append([cx, cy])
-
-                total_slots = 0
-                filled_slots = []
-                free_slots = []
-
-                for i, polyline in enumerate(polylines):
-                    total_slots += 1
-                    for cx, cy in detected_cars:
-                        result = cv2.pointPolygonTest(polyline, (cx, cy), False)
-                        if result >= 0:
-                            filled_slots.append(area_names[i])
-
-                free_slots = [area_name for area_name in area_names if area_name not in filled_slots]
-
-                # Update slot status if changed
-                if filled_slots != last_sent_slots:
-                    await emit_socket_event("update", filled_slots, free_slots)
-                    last_sent_slots = filled_slots
-                    last_emit_time = current_time
-
-            # Visualization
-            for i, polyline in enumerate(polylines):
-                color = (0, 0, 255) if area_names[i] in last_sent_slots else (0, 255, 0)
-                cv2.polylines(frame, [polyline], True, color, 2)
-                cvzone.putTextRect(frame, f"{area_names[i]}", tuple(polyline[0]), 1, 1)
-
-            filled_text = f"Filled Slots: [{', '.join(last_sent_slots)}]" if last_sent_slots else "Filled Slots: [None]"
-            cvzone.putTextRect(frame, filled_text, (50, 100), 2, 2, offset=10, colorB=(4, 217, 252))
-
-            cvzone.putTextRect(frame, f"Free Slots: {len(area_names) - len(last_sent_slots)}", (50, 50), 2, 2, offset=10, colorB=(4, 217, 252))
-
-            cv2.imwrite("Real_Time_Stream.jpeg", frame)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord("q"):
-                break
-
-        except Exception as e:
-            print(f"Error processing stream: {e}")
-            break
+    start_metrics_listener(METRICS_PORT)
+    pipeline.publisher.start()
+    capture.start()
+    if stream:
+        stream.start()
+    supervisor.start()
+    failures = 0
+    try:
+        while True:
+            try:
+                # Sleep until the next inference or visualization is due; nothing
+                # is decoded in between
+                wake = last_yolo_time + scheduler.interval
+                if visualizer.enabled:
+                    wake = min(wake, visualizer.next_due)
+                await asyncio.sleep(max(0.0, wake - time.time()))
+
+                frame, frame_time = await asyncio.to_thread(capture.read)
+                if frame is None:
+                    logger.warning("no frame from capture")
+                    ERRORS.labels(component="capture").inc()
+                    continue
+
+                current_time = time.time()
+
+                # Run YOLO analysis only after the scheduled interval
+                if current_time - last_yolo_time >= scheduler.interval:
+                    last_yolo_time = current_time
+
+                    frame_age = current_time - frame_time
+                    cpu_start = time.process_time()
+                    latency = None
+                    detections = None
+                    if pipeline.needs_inference(frame):
+                        inference_start = time.perf_counter()
+                        # Off the loop, so publishing, spool syncs and the supervisor keep running
+                        detections = await asyncio.to_thread(detect, model, frame, pipeline.tiler)
+                        latency = time.perf_counter() - inference_start
+
+                    message = pipeline.update(detections, current_time)
+                    cycle_cpu = time.process_time() - cpu_start
+                    interval, reason = scheduler.record(pipeline.activity, latency)
+                    logger.info("cadence interval=%.2fs reason=%s stats=%s", interval, reason, scheduler.stats())
+                    if pipeline.change_gate and detections is None:
+                        logger.debug("inference skipped, no slot change gate=%s cycle_cpu_ms=%.0f",
+                                     pipeline.change_gate.stats(), cycle_cpu * 1000)
+                    if message:
+                        logger.debug("queued type=%s seq=%d slots=%d", message["type"], message["seq"], len(message["slots"]))
+                        logger.debug("tracker=%s publisher=%s capture=%s frame_age_ms=%.0f cycle_cpu_ms=%.0f",
+                                     pipeline.slot_tracker.stats(), pipeline.publisher.stats(), capture.stats(),
+                                     frame_age * 1000, cycle_cpu * 1000)
+                        last_sent_slots = pipeline.filled_slots
+                        last_emit_time = current_time
+
+                visualizer.submit(frame, last_sent_slots, current_time)
+                failures = 0
+
+            except Exception as e:
+                # A failing cycle is retried with a growing delay instead of ending the detector
+                failures += 1
+                delay = min(MAX_CYCLE_RETRY, 0.5 * 2 ** (failures - 1))
+                logger.exception("error processing stream: %s retry_in=%.1fs", e, delay)
+                ERRORS.labels(component="detector").inc()
+                await asyncio.sleep(delay)
+    finally:
+        await supervisor.stop()
+        # Flushes the spool; unsent messages are replayed by the next start
+        await pipeline.publisher.stop()
 
 asyncio.run(main())
 
-cap.release()
-cv2.destroyAllWindows()
+capture.stop()
+if stream:
+    stream.stop()
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import random
+import time
+import websockets
+from prometheus_client import Counter, Gauge, Histogram
+from slot_protocol import coalesce
+from observability import ERRORS, SLOW_BUCKETS
+
+DEFAULT_QUEUE_SIZE = 64
+REPLAY_BATCH = 100  # spooled messages read per batch while catching up
+MIN_BACKOFF = 0.5  # seconds
+MAX_BACKOFF = 30.0  # seconds
+
+SEND_SECONDS = Histogram("parkease_publisher_send_seconds", "WebSocket send time per slot message",
+                         ["camera"], buckets=SLOW_BUCKETS)
+QUEUE_DEPTH = Gauge("parkease_publisher_queue_depth", "Slot messages waiting to be sent", ["camera"])
+COALESCED = Counter("parkease_publisher_coalesced_total", "Queued messages merged on overflow", ["camera"])
+RECONNECTS = Counter("parkease_publisher_reconnects_total", "Failed connects and sends", ["camera"])
+
+logger = logging.getLogger(__name__)
+
+
+class SlotEventPublisher:
+    """Keeps one WebSocket open to the server and sends slot messages from a bounded queue.
+
+    `publish` never blocks the caller: when the queue is full, everything
+    pending is coalesced into a single equivalent message. A message whose
+    send fails is kept and retried after the reconnect.
+
+    With a spool, messages are instead appended to it and sent from it in
+    order. After every reconnect everything the server has not acked is sent
+    again; the server drops what it already had by seq.
+    """
+
+    def __init__(self, url, maxsize=DEFAULT_QUEUE_SIZE, on_resync=None, name="camera", spool=None):
+        self.url = url
+        self.name = name
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.spool = spool
+        self._spooled = asyncio.Event()
+        if spool:
+            QUEUE_DEPTH.labels(camera=name).set_function(lambda: len(spool.messages))
+        else:
+            QUEUE_DEPTH.labels(camera=name).set_function(self.queue.qsize)
+        self.on_resync = on_resync
+        self._task = None
+        self._receiver = None
+        self._websocket = None
+
+        self.sent = 0
+        self.replayed = 0
+        self.acked_seq = None
+        self.coalesced = 0
+        self.reconnects = 0
+        self.last_send_latency = 0.0
+        self.total_send_latency = 0.0
+
+    def start(self):
+        if self._task is None:
+            if self.spool:
+                self.spool.start()
+            self._task = asyncio.create_task(self._run_spooled() if self.spool else self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._cancel_receiver()
+        if self._websocket:
+            await self._websocket.close()
+            self._websocket = None
+        if self.spool:
+            await self.spool.stop()
+
+    def publish(self, message):
+        if self.spool:
+            self.spool.append(message)
+            self._spooled.set()
+            return
+        if self.queue.full():
+            pending = [self.queue.get_nowait() for _ in range(self.queue.qsize())]
+            self.coalesced += len(pending)
+            COALESCED.labels(camera=self.name).inc(len(pending))
+            message = coalesce(pending + [message])
+        self.queue.put_nowait(message)
+
+    async def _connect(self):
+        backoff = MIN_BACKOFF
+        while True:
+            try:
+                self._websocket = await websockets.connect(self.url)
+                # Held here: the loop keeps only weak references to tasks
+                self._cancel_receiver()
+                self._receiver = asyncio.create_task(self._receive(self._websocket))
+                return self._websocket
+            except Exception as e:
+                self.reconnects += 1
+                RECONNECTS.labels(camera=self.name).inc()
+                logger.warning("publisher connect failed camera=%s retry_in=%.1fs error=%s", self.name, backoff, e)
+                await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+                backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def _cancel_receiver(self):
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+
+    async def _receive(self, websocket):
+        # Server replies are acks, and resync requests after a sequence gap
+        try:
+            async for raw in websocket:
+                reply = json.loads(raw)
+                if reply.get("type") == "ack":
+                    self.acked_seq = reply["seq"]
+                    if self.spool:
+                        self.spool.ack(reply["seq"])
+                elif reply.get("type") == "resync" and self.on_resync:
+                    self.on_resync()
+        except Exception:
+            pass
+
+    async def _run(self):
+        message = None
+        while True:
+            if message is None:
+                message = await self.queue.get()
+            if self._websocket is None:
+                await self._connect()
+            try:
+                await self._send(message)
+                message = None
+            except Exception as e:
+                self._send_failed(e)
+
+    async def _send(self, message):
+        start = time.perf_counter()
+        await self._websocket.send(json.dumps(message))
+        self.last_send_latency = time.perf_counter() - start
+        SEND_SECONDS.labels(camera=self.name).observe(self.last_send_latency)
+        self.total_send_latency += self.last_send_latency
+        self.sent += 1
+
+    def _send_failed(self, e):
+        logger.warning("publisher send failed camera=%s error=%s", self.name, e)
+        ERRORS.labels(component="publisher").inc()
+        RECONNECTS.labels(camera=self.name).inc()
+        self.reconnects += 1
+        self._websocket = None
+
+    async def _run_spooled(self):
+        sent_seq = None
+        while True:
+            if self._websocket is None:
+                await self._connect()
+                # Start over from the last ack: sent but unacked messages may be lost
+                if sent_seq is not None and self.spool.acked_seq is not None:
+                    self.replayed += max(0, sent_seq - self.spool.acked_seq)
+                sent_seq = self.spool.acked_seq
+            batch = self.spool.pending(sent_seq, REPLAY_BATCH)
+            if not batch:
+                self._spooled.clear()
+                await self._spooled.wait()
+                continue
+            try:
+                for message in batch:
+                    await self._send(message)
+                    sent_seq = message["seq"]
+            except Exception as e:
+                self._send_failed(e)
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "sent": self.sent,
+            "replayed": self.replayed,
+            "acked_seq": self.acked_seq,
+            "coalesced": self.coalesced,
+            "reconnects": self.reconnects,
+            "last_send_latency_ms": round(self.last_send_latency * 1000, 3),
+            "avg_send_latency_ms": round(self.total_send_latency / self.sent * 1000, 3) if self.sent else 0.0,
+        }
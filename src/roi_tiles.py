@@ -0,0 +1,113 @@
+import math
+import cv2
+import numpy as np
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+
+DEFAULT_TILE_SIZE = 320  # frame pixels
+DEFAULT_TILE_MARGIN = 32  # frame pixels around the slots, so whole cars stay in view
+DEFAULT_TILE_OVERLAP = 64  # frame pixels shared by neighbouring tiles, about one car length
+DEFAULT_MODEL_IMGSZ = 640
+
+
+def nms(detections, iou_threshold=0.5, containment_threshold=0.8, tile_index=None, tiles=None):
+    # Class-agnostic suppression for duplicates of one car seen by two
+    # overlapping tiles; a box mostly inside a stronger one is a cut-off copy.
+    # With tile_index (tile of each detection) and tiles, only pairs from
+    # different tiles that both reach into those tiles' overlap are
+    # candidates, so a car partly hidden behind a nearer one is kept.
+    if len(detections) == 0:
+        return detections
+    order = np.argsort(-detections[:, 4])
+    boxes = detections[order, :4]
+    if tile_index is not None:
+        tile_ids = np.asarray(tile_index)[order]
+        tile_boxes = np.asarray(tiles, dtype=np.float64).reshape(-1, 4)[tile_ids]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    keep = []
+    suppressed = np.zeros(len(order), dtype=bool)
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(order[i])
+        xx1 = np.maximum(boxes[i, 0], boxes[i + 1:, 0])
+        yy1 = np.maximum(boxes[i, 1], boxes[i + 1:, 1])
+        xx2 = np.minimum(boxes[i, 2], boxes[i + 1:, 2])
+        yy2 = np.minimum(boxes[i, 3], boxes[i + 1:, 3])
+        inter = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+        iou = inter / np.maximum(areas[i] + areas[i + 1:] - inter, 1e-9)
+        contained = inter / np.maximum(areas[i + 1:], 1e-9)
+        duplicate = (iou >= iou_threshold) | (contained >= containment_threshold)
+        if tile_index is not None:
+            other = tile_boxes[i + 1:]
+            ox1, oy1 = np.maximum(tile_boxes[i, 0], other[:, 0]), np.maximum(tile_boxes[i, 1], other[:, 1])
+            ox2, oy2 = np.minimum(tile_boxes[i, 2], other[:, 2]), np.minimum(tile_boxes[i, 3], other[:, 3])
+            seam = (ox2 > ox1) & (oy2 > oy1) & (tile_ids[i + 1:] != tile_ids[i])
+            seam &= (np.minimum(boxes[i, 2], ox2) > np.maximum(boxes[i, 0], ox1))
+            seam &= (np.minimum(boxes[i, 3], oy2) > np.maximum(boxes[i, 1], oy1))
+            seam &= (np.minimum(boxes[i + 1:, 2], ox2) > np.maximum(boxes[i + 1:, 0], ox1))
+            seam &= (np.minimum(boxes[i + 1:, 3], oy2) > np.maximum(boxes[i + 1:, 1], oy1))
+            duplicate &= seam
+        suppressed[i + 1:] |= duplicate
+    return detections[np.sort(keep)]
+
+
+class RoiTiler:
+    """Crops inference to fixed-size tiles covering the marked slots.
+
+    Tiles are laid out once from the polylines: a grid of `tile_size`
+    squares overlapping by `overlap`, keeping only squares that touch a slot
+    (grown by `margin`); with the layout's label mask nothing is rasterized.
+    Tiles are predicted at an imgsz that keeps the pixel
+    scale of full-frame inference, so model cost scales with `covered_ratio`.
+    """
+
+    def __init__(self, polylines, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), tile_size=DEFAULT_TILE_SIZE,
+                 margin=DEFAULT_TILE_MARGIN, overlap=DEFAULT_TILE_OVERLAP, model_imgsz=DEFAULT_MODEL_IMGSZ,
+                 labels=None):
+        width, height = frame_size
+        tile_w, tile_h = min(tile_size, width), min(tile_size, height)
+
+        if labels is not None:
+            mask = labels >= 0
+        else:
+            mask = np.zeros((height, width), dtype=np.uint8)
+            for polyline in polylines:
+                cv2.fillPoly(mask, [np.asarray(polyline, np.int32).reshape(-1, 1, 2)], 1)
+
+        # Neighbouring tiles overlap so a car on a seam is whole in one of them.
+        # Growing the tile by the margin is the same test as growing the slots.
+        self.tiles = []
+        for y0 in self._starts(height, tile_h, overlap):
+            for x0 in self._starts(width, tile_w, overlap):
+                if mask[max(0, y0 - margin):y0 + tile_h + margin, max(0, x0 - margin):x0 + tile_w + margin].any():
+                    self.tiles.append((x0, y0, x0 + tile_w, y0 + tile_h))
+
+        scale = model_imgsz / max(width, height)
+        self.imgsz = max(32, math.ceil(max(tile_w, tile_h) * scale / 32) * 32)
+        self.covered_ratio = len(self.tiles) * tile_w * tile_h / (width * height)
+
+    @staticmethod
+    def _starts(length, tile, overlap):
+        if tile >= length:
+            return [0]
+        stride = max(tile - overlap, 1)
+        starts = list(range(0, length - tile, stride))
+        return starts + [length - tile]
+
+    def crops(self, frame):
+        return [np.ascontiguousarray(frame[y0:y1, x0:x1]) for x0, y0, x1, y1 in self.tiles]
+
+    def merge(self, tile_detections):
+        # Shift each tile's (N, 6) detections back to frame coordinates
+        shifted, tile_index = [], []
+        for i, ((x0, y0, _, _), detections) in enumerate(zip(self.tiles, tile_detections)):
+            detections = np.asarray(detections, dtype=np.float64).reshape(-1, 6).copy()
+            detections[:, [0, 2]] += x0
+            detections[:, [1, 3]] += y0
+            shifted.append(detections)
+            tile_index.append(np.full(len(detections), i))
+        if not shifted:
+            return np.zeros((0, 6))
+        # Each tile's own predict already ran NMS; only seam duplicates remain
+        return nms(np.concatenate(shifted), tile_index=np.concatenate(tile_index), tiles=self.tiles)
@@ -0,0 +1,89 @@
+import os
+import time
+
+DEFAULT_MIN_INTERVAL = 1.0  # seconds
+DEFAULT_MAX_INTERVAL = 10.0  # seconds
+DEFAULT_CPU_TARGET = 0.5  # share of the node's cores for the whole detector process
+DEFAULT_BUSY_INTERVAL = 4.0  # seconds, the fixed cadence before adaptation; CPU backoff stops here while slots change
+SPEEDUP_FACTOR = 0.5
+SLOWDOWN_FACTOR = 1.25
+SMOOTHING = 0.3  # weight of the newest sample in the moving averages
+
+
+class AdaptiveScheduler:
+    """Picks the next inference interval from lot activity and measured cost.
+
+    Any slot changing (or waiting on debounce) halves the interval so
+    arrivals are confirmed quickly; quiet cycles grow it by a quarter back
+    towards `max_interval`. The interval never drops below the average
+    inference latency, and backs off whenever the process's CPU use since
+    the last decision is over `cpu_target` (a share of all cores; it also
+    counts frame decoding). While slots are changing the CPU backoff stops
+    at `busy_interval`, so a busy lot is never polled slower than that.
+    """
+
+    def __init__(self, initial=DEFAULT_MAX_INTERVAL, min_interval=DEFAULT_MIN_INTERVAL,
+                 max_interval=DEFAULT_MAX_INTERVAL, cpu_target=DEFAULT_CPU_TARGET,
+                 busy_interval=DEFAULT_BUSY_INTERVAL):
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Expected 0 < min_interval <= max_interval")
+        if cpu_target <= 0:
+            raise ValueError("cpu_target must be positive")
+
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cpu_target = cpu_target
+        self.busy_interval = min(max(busy_interval, min_interval), max_interval)
+        self.cores = os.cpu_count() or 1
+        self.interval = min(max(initial, min_interval), max_interval)
+
+        self.latency = None
+        self.activity = 0.0
+        self.cpu_utilisation = 0.0
+        self.decisions = 0
+        self._last_wall = time.monotonic()
+        self._last_cpu = time.process_time()
+
+    @staticmethod
+    def _smooth(average, sample):
+        return sample if average is None else (1 - SMOOTHING) * average + SMOOTHING * sample
+
+    def record(self, changes, latency=None):
+        # changes: slots flipped or pending this cycle; latency: predict wall
+        # time, None when inference was skipped. Returns (interval, reason).
+        wall, cpu = time.monotonic(), time.process_time()
+        if wall > self._last_wall:
+            self.cpu_utilisation = (cpu - self._last_cpu) / (wall - self._last_wall) / self.cores
+        self._last_wall, self._last_cpu = wall, cpu
+
+        if latency is not None:
+            self.latency = self._smooth(self.latency, latency)
+        self.activity = self._smooth(self.activity, changes)
+        self.decisions += 1
+
+        if self.cpu_utilisation > self.cpu_target:
+            interval, reason = self.interval * SLOWDOWN_FACTOR, "cpu"
+            if changes:
+                interval = min(interval, self.busy_interval)
+        elif changes:
+            interval, reason = self.interval * SPEEDUP_FACTOR, "activity"
+        else:
+            interval, reason = self.interval * SLOWDOWN_FACTOR, "idle"
+
+        floor = max(self.min_interval, self.latency or 0.0)
+        if interval < floor:
+            interval, reason = floor, "latency" if floor > self.min_interval else "min"
+        elif interval > self.max_interval:
+            interval, reason = self.max_interval, "max"
+
+        self.interval = interval
+        return interval, reason
+
+    def stats(self):
+        return {
+            "interval": round(self.interval, 2),
+            "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "activity": round(self.activity, 2),
+            "cpu_utilisation": round(self.cpu_utilisation, 3),
+            "decisions": self.decisions,
+        }
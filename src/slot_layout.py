@@ -0,0 +1,154 @@
+import json
+import os
+import struct
+import cv2
+import numpy as np
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT, DEFAULT_COVERAGE_THRESHOLD, rasterize_slots
+
+LAYOUT_VERSION = 1
+LAYOUT_MAGIC = b"PKLAYOUT"
+DEFAULT_LAYOUT_PATH = "parkease.layout"
+LEGACY_LAYOUT_PATH = "parkease"
+DEFAULT_SIMPLIFY_EPSILON = 1.5  # pixels
+ALIGNMENT = 64  # bytes, for every array in the file
+
+
+def is_layout_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(LAYOUT_MAGIC)) == LAYOUT_MAGIC
+
+
+def simplify_polyline(polyline, epsilon=DEFAULT_SIMPLIFY_EPSILON):
+    # Drops the near-collinear mouse-move points; a slot keeps at least a triangle
+    polyline = np.asarray(polyline, np.int32).reshape(-1, 2)
+    if epsilon <= 0 or len(polyline) <= 3:
+        return polyline
+    simplified = cv2.approxPolyDP(polyline.reshape(-1, 1, 2), epsilon, True).reshape(-1, 2)
+    return simplified if len(simplified) >= 3 else polyline
+
+
+class SlotLayout:
+    """Marked slots of one camera, stored as a flat vertex buffer plus offsets.
+
+    Slot i is vertices[offsets[i]:offsets[i + 1]]. The file is a magic and
+    a JSON header (schema version, frame size, lot id, per-slot metadata)
+    followed by 64-byte aligned raw arrays, so loading is a memory map with
+    no unpickling. The rasterized label mask is computed at save time and
+    loaded with the rest; ROI tiles, the change gate and the overlay are
+    derived from it, so startup draws no polygons.
+    """
+
+    def __init__(self, polylines, area_names, thresholds=None, frame_size=(FRAME_WIDTH, FRAME_HEIGHT),
+                 lot_id=None, metadata=None):
+        if len(polylines) != len(area_names):
+            raise ValueError("polylines and area_names must have the same length")
+        self.area_names = [str(name) for name in area_names]
+        self.thresholds = list(thresholds) if thresholds is not None else \
+            [DEFAULT_COVERAGE_THRESHOLD] * len(self.area_names)
+        if len(self.thresholds) != len(self.area_names):
+            raise ValueError("thresholds and area_names must have the same length")
+        self.frame_size = tuple(frame_size)
+        self.lot_id = lot_id
+        self.metadata = list(metadata) if metadata is not None else [{} for _ in self.area_names]
+
+        polylines = [np.asarray(polyline, np.int32).reshape(-1, 2) for polyline in polylines]
+        counts = [len(polyline) for polyline in polylines]
+        self.offsets = np.zeros(len(polylines) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum(counts)
+        self.vertices = np.concatenate(polylines) if polylines else np.zeros((0, 2), dtype=np.int32)
+        self.labels = None
+
+    @property
+    def num_slots(self):
+        return len(self.area_names)
+
+    @property
+    def polylines(self):
+        # Views into the vertex buffer, no copies
+        return [self.vertices[self.offsets[i]:self.offsets[i + 1]] for i in range(self.num_slots)]
+
+    def simplified(self, epsilon=DEFAULT_SIMPLIFY_EPSILON):
+        return SlotLayout([simplify_polyline(polyline, epsilon) for polyline in self.polylines],
+                          self.area_names, self.thresholds, self.frame_size, self.lot_id, self.metadata)
+
+    def derive(self):
+        # Slot index per pixel, -1 outside
+        dtype = np.int16 if self.num_slots < np.iinfo(np.int16).max else np.int32
+        self.labels = rasterize_slots(self.polylines, self.frame_size, dtype)
+        return self
+
+    def save(self, path=DEFAULT_LAYOUT_PATH):
+        if self.labels is None:
+            self.derive()
+        arrays = {"offsets": self.offsets, "vertices": self.vertices, "labels": self.labels}
+        header = {
+            "version": LAYOUT_VERSION,
+            "frame_size": list(self.frame_size),
+            "lot_id": self.lot_id,
+            "slots": [
+                dict(meta, name=name, threshold=float(threshold))
+                for name, threshold, meta in zip(self.area_names, self.thresholds, self.metadata)
+            ],
+            "arrays": {},
+        }
+
+        # Array offsets depend on the header length and vice versa; grow the
+        # header's reserved space until the offsets fit in it
+        start = 0
+        while True:
+            position = start
+            for name, array in arrays.items():
+                header["arrays"][name] = {"offset": position, "dtype": array.dtype.str, "shape": list(array.shape)}
+                position = _align(position + array.nbytes)
+            header_bytes = json.dumps(header).encode()
+            needed = _align(len(LAYOUT_MAGIC) + 4 + len(header_bytes))
+            if needed <= start:
+                break
+            start = needed
+
+        # Written beside the target and renamed over it, so a running detector
+        # never maps or reloads a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(LAYOUT_MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+            for name, array in arrays.items():
+                f.seek(header["arrays"][name]["offset"])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.truncate(position)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path=DEFAULT_LAYOUT_PATH, mmap=True):
+        with open(path, "rb") as f:
+            if f.read(len(LAYOUT_MAGIC)) != LAYOUT_MAGIC:
+                raise ValueError(f"{path} is not a slot layout file (a legacy pickle? run migrate_layout.py)")
+            (length,) = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(length))
+        if header["version"] > LAYOUT_VERSION:
+            raise ValueError(f"{path} has layout version {header['version']}, this build reads up to {LAYOUT_VERSION}")
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if mmap and int(np.prod(shape)):
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape)
+            else:
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(path, dtype=dtype, count=count, offset=spec["offset"]).reshape(shape)
+
+        slots = header["slots"]
+        layout = cls.__new__(cls)
+        layout.area_names = [slot["name"] for slot in slots]
+        layout.thresholds = [slot.get("threshold", DEFAULT_COVERAGE_THRESHOLD) for slot in slots]
+        layout.metadata = [{k: v for k, v in slot.items() if k not in ("name", "threshold")} for slot in slots]
+        layout.frame_size = tuple(header["frame_size"])
+        layout.lot_id = header.get("lot_id")
+        layout.offsets = arrays["offsets"]
+        layout.vertices = arrays["vertices"]
+        layout.labels = arrays["labels"]
+        return layout
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,176 @@
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Optional
+
+# Slot status messages exchanged between parking_slot_detection.py and the
+# FastAPI server. Statuses use the ParkingSlot.status convention: True = free.
+#
+#   {"version": 2, "type": "delta" | "snapshot", "session": "9f1c...", "seq": 17,
+#    "slots": {"12": false, "13": true}, "timestamp": 1700000000}
+#
+# Deltas carry only the slots that changed; snapshots carry every slot and
+# let the server resync after a gap or a restart on either side. `seq`
+# increases monotonically within a detector `session`. A delta produced by
+# coalescing several queued deltas also carries `base_seq`, the seq of the
+# first message it replaces, so the server does not mistake it for a gap.
+# A detector with a spool resumes its session and seq after a restart, so
+# replayed messages are deduplicated by seq like any other. Several
+# detectors may report one lot, each with its own session.
+
+PROTOCOL_VERSION = 2
+DELTA = "delta"
+SNAPSHOT = "snapshot"
+
+DEFAULT_SNAPSHOT_EVERY = 50  # messages
+DEFAULT_SNAPSHOT_INTERVAL = 300.0  # seconds
+IDLE_SESSIONS = 16  # sessions without an open connection remembered per lot
+
+
+class SlotUpdateEncoder:
+    def __init__(self, snapshot_every=DEFAULT_SNAPSHOT_EVERY, snapshot_interval=DEFAULT_SNAPSHOT_INTERVAL):
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.session = uuid.uuid4().hex
+        self.seq = 0
+        self.last_snapshot_seq = None
+        self.last_snapshot_time = 0.0
+
+    def resume(self, message):
+        # Continue the session of the last spooled message, opening with a snapshot
+        self.session = message["session"]
+        self.seq = int(message["seq"])
+        self.last_snapshot_seq = None
+
+    def request_snapshot(self):
+        self.last_snapshot_seq = None
+
+    def snapshot_due(self, now=None):
+        now = time.time() if now is None else now
+        if self.last_snapshot_seq is None:
+            return True
+        return (self.seq - self.last_snapshot_seq >= self.snapshot_every
+                or now - self.last_snapshot_time >= self.snapshot_interval)
+
+    def encode(self, slots, snapshot=False, now=None):
+        now = time.time() if now is None else now
+        self.seq += 1
+        if snapshot:
+            self.last_snapshot_seq = self.seq
+            self.last_snapshot_time = now
+        return {
+            "version": PROTOCOL_VERSION,
+            "type": SNAPSHOT if snapshot else DELTA,
+            "session": self.session,
+            "seq": self.seq,
+            "slots": {str(slot): bool(status) for slot, status in slots.items()},
+            "timestamp": int(now),
+        }
+
+
+class SlotUpdateDecoder:
+    """Tracks the sequence of one detector stream and normalizes its messages.
+
+    `accept` returns (kind, slots) where slots maps slot number to status, or
+    (None, {}) for a duplicate or stale message that must not be applied.
+    After a gap the delta is still applied (statuses are absolute) and
+    `needs_resync` stays set until the next snapshot arrives.
+    """
+
+    def __init__(self):
+        self.session = None
+        self.last_seq = None
+        self.needs_resync = True
+        self.gaps = 0
+        self.duplicates = 0
+
+    def accept(self, message):
+        # Pre-versioned detectors send full filled/free lists
+        if "version" not in message:
+            slots = {str(s): False for s in message.get("filled_slots", [])}
+            slots.update({str(s): True for s in message.get("free_slots", [])})
+            self.needs_resync = False
+            return SNAPSHOT, slots
+
+        if message["version"] != PROTOCOL_VERSION:
+            raise ValueError(f"Unsupported slot protocol version: {message['version']}")
+
+        kind, seq = message["type"], int(message["seq"])
+        if kind not in (DELTA, SNAPSHOT):
+            raise ValueError(f"Unknown slot message type: {kind}")
+
+        # A new session means the detector restarted and its sequence reset
+        session = message.get("session")
+        if session != self.session:
+            self.session = session
+            self.last_seq = None
+
+        if self.last_seq is not None and seq <= self.last_seq:
+            self.duplicates += 1
+            return None, {}
+
+        slots = {str(slot): bool(status) for slot, status in message.get("slots", {}).items()}
+
+        if kind == SNAPSHOT:
+            self.last_seq = seq
+            self.needs_resync = False
+            return kind, slots
+
+        base_seq = int(message.get("base_seq", seq))
+        if self.last_seq is None or base_seq != self.last_seq + 1:
+            self.gaps += 1
+            self.needs_resync = True
+
+        self.last_seq = seq
+        return kind, slots
+
+
+class LotStreams:
+    """Decoders for every detector session reporting one lot.
+
+    Each session keeps its own sequence, so two detectors on one lot never
+    mistake each other's messages for duplicates. A session that reconnects
+    (a detector replaying its spool) finds its decoder again; decoders of
+    sessions with no open connection are forgotten oldest first beyond
+    `idle_sessions`.
+    """
+
+    def __init__(self, idle_sessions=IDLE_SESSIONS):
+        self.idle_sessions = idle_sessions
+        self.decoders: Dict[Optional[str], SlotUpdateDecoder] = {}
+        self.connections = Counter()
+
+    def attach(self, session: Optional[str]) -> SlotUpdateDecoder:
+        # Called when a connection starts sending a session
+        self.connections[session] += 1
+        decoder = self.decoders.pop(session, None) or SlotUpdateDecoder()
+        self.decoders[session] = decoder
+        return decoder
+
+    def detach(self, session: Optional[str]):
+        self.connections[session] -= 1
+        if self.connections[session] <= 0:
+            del self.connections[session]
+        idle = [s for s in self.decoders if s not in self.connections]
+        for s in idle[:max(0, len(idle) - self.idle_sessions)]:
+            del self.decoders[s]
+
+    def connected(self) -> int:
+        return sum(self.connections.values())
+
+
+def coalesce(messages):
+    # Merge queued messages of one session into one equivalent message. A
+    # snapshot supersedes everything queued before it; later deltas are
+    # folded into it, so later statuses win.
+    merged = None
+    for message in messages:
+        if merged is None or message["type"] == SNAPSHOT:
+            merged = dict(message, slots=dict(message["slots"]))
+            continue
+        if merged["type"] == DELTA:
+            merged.setdefault("base_seq", merged["seq"])
+        merged["slots"].update(message["slots"])
+        merged["seq"] = message["seq"]
+        merged["timestamp"] = message["timestamp"]
+    return merged
@@ -0,0 +1,167 @@
+import asyncio
+import os
+from typing import Any, Dict, List, Set
+from prisma.errors import UniqueViolationError
+
+# Upper bound on concurrent ParkingSlot writes across all detector connections
+DB_WRITE_CONCURRENCY = int(os.getenv("DB_WRITE_CONCURRENCY", 8))
+
+db_write_semaphore = asyncio.Semaphore(DB_WRITE_CONCURRENCY)
+# Rows per create_many call when provisioning slots
+PROVISION_CHUNK_SIZE = int(os.getenv("PROVISION_CHUNK_SIZE", 1000))
+
+
+class SlotDirectory:
+    """In-process map of lot id -> slot number -> ParkingSlot id.
+
+    Slot ids never change after /create_parking_slots, so the status path
+    resolves them here instead of querying Mongo. Unknown slots are looked up
+    once (a miss) and cached, so an invalidated lot reloads lazily; slot
+    numbers the lookup does not find are remembered as absent until add() or
+    invalidate(), so they do not cost a query on every flush.
+    """
+
+    def __init__(self):
+        self.lots: Dict[str, Dict[int, str]] = {}
+        self.absent: Dict[str, Set[int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+    async def warm(self, prisma):
+        self.lots.clear()
+        self.absent.clear()
+        for lot in await prisma.parkinglot.find_many():
+            self.lots[lot.id] = {}
+        for slot in await prisma.parkingslot.find_many():
+            self.add(slot.lotId, slot.slotNumber, slot.id)
+
+    def add_lot(self, lot_id: str):
+        self.lots.setdefault(lot_id, {})
+
+    def add(self, lot_id: str, slot_number: int, slot_id: str):
+        self.lots.setdefault(lot_id, {})[int(slot_number)] = slot_id
+        self.absent.get(lot_id, set()).discard(int(slot_number))
+
+    def invalidate(self, lot_id: str = None):
+        self.invalidations += 1
+        if lot_id is None:
+            self.lots.clear()
+            self.absent.clear()
+        else:
+            self.lots.pop(lot_id, None)
+            self.absent.pop(lot_id, None)
+
+    async def resolve(self, prisma, lot_id: str, slot_numbers: List[int]) -> Dict[int, str]:
+        slots = self.lots.get(lot_id, {})
+        resolved = {n: slots[n] for n in slot_numbers if n in slots}
+        self.hits += len(resolved)
+
+        absent = self.absent.get(lot_id, set())
+        missing = [n for n in slot_numbers if n not in resolved and n not in absent]
+        self.skipped += len(slot_numbers) - len(resolved) - len(missing)
+        if missing:
+            self.misses += len(missing)
+            for slot in await prisma.parkingslot.find_many(
+                where={"lotId": lot_id, "slotNumber": {"in": missing}}
+            ):
+                self.add(lot_id, slot.slotNumber, slot.id)
+                resolved[slot.slotNumber] = slot.id
+            # Not provisioned: skipped without a query until add() or invalidate()
+            self.absent.setdefault(lot_id, set()).update(n for n in missing if n not in resolved)
+        return resolved
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "lots": len(self.lots),
+            "slots": sum(len(slots) for slots in self.lots.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "absent": sum(len(numbers) for numbers in self.absent.values()),
+            "skipped_absent": self.skipped,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def group_by_status(slots: Dict[str, bool]) -> Dict[bool, List[int]]:
+    groups: Dict[bool, List[int]] = {True: [], False: []}
+    for slot_number, status in slots.items():
+        groups[bool(status)].append(int(slot_number))
+    return {status: numbers for status, numbers in groups.items() if numbers}
+
+
+async def write_slot_statuses(prisma, lot_id: str, slots: Dict[str, bool], directory: SlotDirectory = None) -> int:
+    # One update_many per target status: at most two queries per message.
+    # With a directory the slots are addressed by cached id, with no lookup.
+    async def write(status: bool, slot_numbers: List[int]) -> int:
+        if directory is None:
+            where = {"lotId": lot_id, "slotNumber": {"in": slot_numbers}}
+        else:
+            ids = await directory.resolve(prisma, lot_id, slot_numbers)
+            if not ids:
+                return 0
+            where = {"id": {"in": list(ids.values())}}
+
+        async with db_write_semaphore:
+            return await prisma.parkingslot.update_many(where=where, data={"status": status})
+
+    counts = await asyncio.gather(*(
+        write(status, slot_numbers) for status, slot_numbers in group_by_status(slots).items()
+    ))
+    return sum(counts)
+
+
+def slot_row(lot_id: str, slot_number: int, location: Dict[str, float]) -> Dict[str, Any]:
+    return {
+        "slotNumber": int(slot_number),
+        "locationX": location.get("lat"),
+        "locationY": location.get("long"),
+        "lotId": lot_id,
+        "status": True,
+    }
+
+
+async def provision_slots(prisma, lot_id: str, locations: Dict[int, Dict[str, float]],
+                          in_transaction: bool = False) -> Dict[str, Any]:
+    # Idempotent on (lotId, slotNumber): missing slots are bulk-created with
+    # create_many, existing ones only get their location updated when it
+    # changed, so re-running a setup never duplicates slots. In a
+    # transaction (`prisma` is the tx client) a duplicate from a concurrent
+    # setup aborts it, so the UniqueViolationError is raised to the caller.
+    existing = {slot.slotNumber: slot for slot in await prisma.parkingslot.find_many(where={"lotId": lot_id})}
+    new = [slot_row(lot_id, n, location) for n, location in locations.items() if int(n) not in existing]
+    moved = [
+        slot_row(lot_id, n, location) for n, location in locations.items()
+        if int(n) in existing and (existing[int(n)].locationX, existing[int(n)].locationY)
+        != (location.get("lat"), location.get("long"))
+    ]
+
+    async def upsert(row: Dict[str, Any]):
+        async with db_write_semaphore:
+            await prisma.parkingslot.upsert(
+                where={"lotId_slotNumber": {"lotId": lot_id, "slotNumber": row["slotNumber"]}},
+                data={"create": row, "update": {"locationX": row["locationX"], "locationY": row["locationY"]}},
+            )
+
+    for start in range(0, len(new), PROVISION_CHUNK_SIZE):
+        chunk = new[start:start + PROVISION_CHUNK_SIZE]
+        try:
+            await prisma.parkingslot.create_many(data=chunk)
+        except UniqueViolationError:
+            if in_transaction:
+                raise
+            # A concurrent setup created some of these first; the unique index
+            # rejects the duplicates, so settle the chunk slot by slot
+            await asyncio.gather(*(upsert(row) for row in chunk))
+    await asyncio.gather(*(upsert(row) for row in moved))
+
+    slots = await prisma.parkingslot.find_many(where={"lotId": lot_id})
+    return {
+        "created": len(new),
+        "updated": len(moved),
+        "unchanged": len(locations) - len(new) - len(moved),
+        "slots": slots,
+    }
@@ -0,0 +1,61 @@
+import numpy as np
+
+DEFAULT_CONFIRM_CYCLES = 2
+
+
+class SlotStateTracker:
+    """Debounces per-slot occupancy so only confirmed transitions are reported.
+
+    A slot flips only after `fill_after` (or `free_after`) consecutive
+    observations disagree with its current state. A disagreeing streak that
+    ends before that is counted as a suppressed flicker.
+    """
+
+    def __init__(self, num_slots, fill_after=DEFAULT_CONFIRM_CYCLES, free_after=DEFAULT_CONFIRM_CYCLES):
+        if fill_after < 1 or free_after < 1:
+            raise ValueError("fill_after and free_after must be at least 1")
+
+        self.fill_after = fill_after
+        self.free_after = free_after
+        self.state = np.zeros(num_slots, dtype=bool)
+        self.streak = np.zeros(num_slots, dtype=np.uint16)
+        self.initialized = False
+
+        self.observations = 0
+        self.transitions = 0
+        self.suppressed_flickers = 0
+
+    def update(self, occupied):
+        occupied = np.asarray(occupied, dtype=bool)
+        if occupied.shape != self.state.shape:
+            raise ValueError(f"Expected {self.state.size} slot observations, got {occupied.size}")
+
+        self.observations += 1
+
+        # The first observation is taken as-is so startup does not wait N cycles
+        if not self.initialized:
+            self.state[:] = occupied
+            self.initialized = True
+            self.transitions += self.state.size
+            return np.arange(self.state.size)
+
+        disagree = occupied != self.state
+        self.suppressed_flickers += int(np.count_nonzero(~disagree & (self.streak > 0)))
+
+        self.streak[~disagree] = 0
+        self.streak[disagree] += 1
+
+        required = np.where(occupied, self.fill_after, self.free_after)
+        flipped = np.flatnonzero(disagree & (self.streak >= required))
+
+        self.state[flipped] = occupied[flipped]
+        self.streak[flipped] = 0
+        self.transitions += flipped.size
+        return flipped
+
+    def stats(self):
+        return {
+            "observations": self.observations,
+            "transitions": self.transitions,
+            "suppressed_flickers": self.suppressed_flickers,
+        }
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import logging
+import os
+from collections import deque
+from typing import Dict, List, Optional
+from prometheus_client import Counter, Gauge
+
+SPOOL_SEGMENT_BYTES = 1 << 20  # rotate segments at 1 MiB
+SPOOL_MAX_BYTES = 64 << 20  # oldest segments are dropped beyond this
+SPOOL_FSYNC_INTERVAL = 0.5  # seconds between batched fsyncs
+SPOOL_MEMORY_MESSAGES = 10000  # unacked messages also kept in memory; older ones are re-read from disk
+SEGMENT_SUFFIX = ".spool"
+ACKED_FILE = "acked"  # last acked seq, so a restart does not resend the current segment
+
+SPOOL_BYTES = Gauge("parkease_spool_bytes", "Bytes held in the local spool", ["camera"])
+SPOOL_DROPPED = Counter("parkease_spool_dropped_total", "Unacked messages dropped by the size cap", ["camera"])
+
+logger = logging.getLogger(__name__)
+
+
+class Segment:
+    def __init__(self, path: str, first_seq: int, last_seq: int = None, size: int = 0, count: int = 0):
+        self.path = path
+        self.first_seq = first_seq
+        self.last_seq = first_seq if last_seq is None else last_seq
+        self.size = size
+        self.count = count
+
+    def read(self) -> List[Dict]:
+        messages = []
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    messages.append(json.loads(line))
+                except ValueError:
+                    # Torn last line from a crash mid-write
+                    break
+        return messages
+
+
+class SlotSpool:
+    """Append-only local log of outgoing slot messages, one JSON line each.
+
+    Every message is written to the current segment before it is sent, with
+    fsyncs batched every `fsync_interval` seconds off the event loop, so the
+    detection loop only pays for one write() per message. Segments rotate at
+    `segment_bytes`; once every message in a segment is acked by the server
+    it is deleted, and beyond `max_bytes` the oldest are dropped (the server
+    then sees a sequence gap and asks for a snapshot). On start the existing
+    segments are loaded, so messages from before a crash are replayed.
+    """
+
+    def __init__(self, directory, segment_bytes=SPOOL_SEGMENT_BYTES, max_bytes=SPOOL_MAX_BYTES,
+                 fsync_interval=SPOOL_FSYNC_INTERVAL, memory_messages=SPOOL_MEMORY_MESSAGES, name="camera"):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self.name = name
+        os.makedirs(directory, exist_ok=True)
+
+        self.segments: List[Segment] = []
+        self.messages = deque(maxlen=memory_messages)
+        # Set while unacked messages exist only on disk
+        self._evicted = False
+        self.last: Optional[Dict] = None
+        self.acked_seq = None
+        self._synced_ack = None
+        self.bytes = 0
+        self._fd = None
+        self._unsynced: List[int] = []
+        self._new_segment = False
+        self._inflight = None
+        self._task = None
+
+        self.appended = 0
+        self.fsyncs = 0
+        self.dropped = 0
+        self._load()
+        SPOOL_BYTES.labels(camera=name).set_function(lambda: self.bytes)
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.directory, ACKED_FILE), "r") as f:
+                self.acked_seq = self._synced_ack = int(f.read())
+        except (OSError, ValueError):
+            pass
+        paths = sorted(
+            (p for p in os.listdir(self.directory) if p.endswith(SEGMENT_SUFFIX)),
+            key=lambda p: int(p[:-len(SEGMENT_SUFFIX)])
+        )
+        for name in paths:
+            path = os.path.join(self.directory, name)
+            segment = Segment(path, int(name[:-len(SEGMENT_SUFFIX)]), size=os.path.getsize(path))
+            messages = segment.read()
+            if not messages:
+                os.remove(path)
+                continue
+            segment.last_seq, segment.count = messages[-1]["seq"], len(messages)
+            self.segments.append(segment)
+            self.bytes += segment.size
+            self.last = messages[-1]
+            messages = [m for m in messages if self.acked_seq is None or m["seq"] > self.acked_seq]
+            self._evicted |= len(self.messages) + len(messages) > self.messages.maxlen
+            self.messages.extend(messages)
+        if not self.segments:
+            # Nothing to resume: the next session starts its sequence over
+            self.acked_seq = self._synced_ack = None
+            if os.path.exists(os.path.join(self.directory, ACKED_FILE)):
+                os.remove(os.path.join(self.directory, ACKED_FILE))
+        else:
+            logger.info("spool loaded camera=%s segments=%d unacked=%d acked_seq=%s", self.name,
+                        len(self.segments), len(self.messages), self.acked_seq)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._inflight is not None:
+            await asyncio.gather(self._inflight, return_exceptions=True)
+        await self.sync()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def append(self, message: Dict):
+        line = (json.dumps(message, separators=(",", ":")) + "\n").encode()
+        # A new segment after a restart too, so nothing is appended to a torn line
+        if self._fd is None or self.segments[-1].size + len(line) > self.segment_bytes:
+            self._rotate(message["seq"])
+        os.write(self._fd, line)
+
+        segment = self.segments[-1]
+        segment.last_seq, segment.size, segment.count = message["seq"], segment.size + len(line), segment.count + 1
+        self.bytes += len(line)
+        self._evicted |= len(self.messages) == self.messages.maxlen
+        self.messages.append(message)
+        self.last = message
+        self.appended += 1
+        if self.bytes > self.max_bytes:
+            self._enforce_cap()
+
+    def _rotate(self, first_seq: int):
+        if self._fd is not None:
+            # Closed by the next sync, after its fsync
+            self._unsynced.append(self._fd)
+        path = os.path.join(self.directory, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self.segments.append(Segment(path, first_seq))
+        self._new_segment = True
+
+    def _enforce_cap(self):
+        while len(self.segments) > 1 and self.bytes > self.max_bytes:
+            segment = self.segments.pop(0)
+            self.bytes -= segment.size
+            unacked = segment.count if self.acked_seq is None else sum(
+                1 for m in segment.read() if m["seq"] > self.acked_seq
+            )
+            os.remove(segment.path)
+            while self.messages and self.messages[0]["seq"] <= segment.last_seq:
+                self.messages.popleft()
+            self.dropped += unacked
+            SPOOL_DROPPED.labels(camera=self.name).inc(unacked)
+            logger.warning("spool full camera=%s dropped_segment=%s unacked=%d", self.name, segment.path, unacked)
+
+    def ack(self, seq: int):
+        if self.acked_seq is not None and seq <= self.acked_seq:
+            return
+        self.acked_seq = seq
+        while self.messages and self.messages[0]["seq"] <= seq:
+            self.messages.popleft()
+        if self._evicted and (not self.messages or self.messages[0]["seq"] <= seq + 1):
+            self._evicted = False
+        # The current segment stays, so the sequence survives a restart
+        while len(self.segments) > 1 and self.segments[0].last_seq <= seq:
+            segment = self.segments.pop(0)
+            self.bytes -= segment.size
+            os.remove(segment.path)
+
+    def pending(self, after_seq: Optional[int], limit: int = 100) -> List[Dict]:
+        # Unacked messages with seq > after_seq, oldest first
+        floor = after_seq if after_seq is not None else (self.acked_seq if self.acked_seq is not None else -1)
+        if not self._evicted or (self.messages and self.messages[0]["seq"] <= floor + 1):
+            batch = []
+            for message in self.messages:
+                if message["seq"] > floor:
+                    batch.append(message)
+                    if len(batch) >= limit:
+                        break
+            return batch
+
+        # Older than what memory holds: read the segments back
+        batch = []
+        for segment in self.segments:
+            if segment.last_seq <= floor:
+                continue
+            for message in segment.read():
+                if message["seq"] > floor:
+                    batch.append(message)
+                    if len(batch) >= limit:
+                        return batch
+        return batch
+
+    async def sync(self):
+        fds, self._unsynced = self._unsynced, []
+        new_segment, self._new_segment = self._new_segment, False
+        acked = self.acked_seq if self.acked_seq != self._synced_ack else None
+        if self._fd is None and not fds and acked is None:
+            return
+        # Shielded: a cancelled caller must not leave an fsync running on a closed fd
+        self._inflight = asyncio.get_running_loop().run_in_executor(None, self._fsync, fds, self._fd, new_segment, acked)
+        await asyncio.shield(self._inflight)
+        self._inflight = None
+        if acked is not None:
+            self._synced_ack = acked
+        self.fsyncs += 1
+
+    def _fsync(self, sealed: List[int], current: Optional[int], new_segment: bool, acked: Optional[int]):
+        for fd in sealed:
+            os.fsync(fd)
+            os.close(fd)
+        if current is not None:
+            os.fsync(current)
+        if acked is not None:
+            # Written after the messages it covers; a stale value only means resending more
+            path = os.path.join(self.directory, ACKED_FILE)
+            with open(path + ".tmp", "w") as f:
+                f.write(str(acked))
+            os.replace(path + ".tmp", path)
+        if new_segment or acked is not None:
+            # Make new directory entries durable as well
+            directory = os.open(self.directory, os.O_RDONLY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            try:
+                await self.sync()
+            except OSError as e:
+                logger.warning("spool fsync failed camera=%s error=%s", self.name, e)
+
+    def stats(self):
+        return {
+            "segments": len(self.segments),
+            "bytes": self.bytes,
+            "appended": self.appended,
+            "acked_seq": self.acked_seq,
+            "fsyncs": self.fsyncs,
+            "dropped": self.dropped,
+        }
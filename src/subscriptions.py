@@ -0,0 +1,133 @@
+import asyncio
+import json
+import os
+from typing import Callable, Dict, Optional, Set
+from fastapi import WebSocket, WebSocketDisconnect
+from prometheus_client import Counter
+
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("SUBSCRIBER_QUEUE_SIZE", 32))
+# What to do with a subscriber whose queue is full: "resync" replaces its
+# backlog with one fresh snapshot, "disconnect" closes it
+SLOW_SUBSCRIBER_POLICY = os.getenv("SLOW_SUBSCRIBER_POLICY", "resync")
+
+FANOUT_MESSAGES = Counter("parkease_fanout_messages_total", "Deltas pushed to lot subscribers")
+SLOW_SUBSCRIBERS = Counter("parkease_slow_subscribers_total", "Subscriber queue overflows", ["action"])
+
+
+class Subscriber:
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+    async def send_loop(self):
+        try:
+            while True:
+                await self.websocket.send_text(await self.queue.get())
+        except Exception:
+            # Dead socket: returning ends the subscription
+            pass
+
+
+class SubscriptionHub:
+    """Per-lot topics pushing slot changes to dashboard WebSockets.
+
+    Each message is serialized once and put on every subscriber's bounded
+    queue; a dedicated sender task per subscriber drains it, so one slow
+    client never holds up the others or the ingest path.
+    """
+
+    def __init__(self, snapshot: Callable[[str], Dict[str, Optional[bool]]], version: Callable[[str], int],
+                 queue_size=SUBSCRIBER_QUEUE_SIZE, policy=SLOW_SUBSCRIBER_POLICY):
+        if policy not in ("resync", "disconnect"):
+            raise ValueError(f"Unknown slow subscriber policy: {policy}")
+        self.snapshot = snapshot
+        # Current version of a lot; publish() runs after it was bumped
+        self.version = version
+        self.queue_size = queue_size
+        self.policy = policy
+        self.topics: Dict[str, Set[Subscriber]] = {}
+        # Held until done: the loop keeps only weak references to tasks
+        self._closing: Set[asyncio.Task] = set()
+
+        self.messages = 0
+        self.resyncs = 0
+        self.disconnects = 0
+
+    def _snapshot_text(self, lot_id: str) -> str:
+        return json.dumps({
+            "type": "snapshot",
+            "lot_id": lot_id,
+            "version": self.version(lot_id),
+            "slots": self.snapshot(lot_id),
+        })
+
+    async def serve(self, websocket: WebSocket, lot_id: str):
+        await websocket.accept()
+        subscriber = Subscriber(websocket, self.queue_size)
+        subscriber.queue.put_nowait(self._snapshot_text(lot_id))
+        self.topics.setdefault(lot_id, set()).add(subscriber)
+
+        sender = asyncio.create_task(subscriber.send_loop())
+        try:
+            # Subscribers only listen; reading detects the disconnect
+            receiver = asyncio.create_task(self._drain(websocket))
+            await asyncio.wait([sender, receiver], return_when=asyncio.FIRST_COMPLETED)
+            receiver.cancel()
+        finally:
+            sender.cancel()
+            self.topics.get(lot_id, set()).discard(subscriber)
+
+    async def _drain(self, websocket: WebSocket):
+        try:
+            while True:
+                await websocket.receive_text()
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    def publish(self, lot_id: str, slots: Dict[str, bool]):
+        if not slots:
+            return
+        subscribers = self.topics.get(lot_id)
+        if not subscribers:
+            return
+
+        text = json.dumps({
+            "type": "delta",
+            "lot_id": lot_id,
+            "version": self.version(lot_id),
+            "slots": slots,
+        })
+        self.messages += 1
+        FANOUT_MESSAGES.inc()
+        for subscriber in list(subscribers):
+            try:
+                subscriber.queue.put_nowait(text)
+            except asyncio.QueueFull:
+                self._overflow(lot_id, subscriber)
+
+    def _overflow(self, lot_id: str, subscriber: Subscriber):
+        SLOW_SUBSCRIBERS.labels(action=self.policy).inc()
+        if self.policy == "disconnect":
+            self.disconnects += 1
+            self.topics[lot_id].discard(subscriber)
+            task = asyncio.create_task(subscriber.websocket.close(code=1013))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return
+
+        # The snapshot already contains everything in the backlog
+        self.resyncs += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(self._snapshot_text(lot_id))
+
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self.topics.values())
+
+    def stats(self):
+        return {
+            "subscribers": {lot_id: len(subscribers) for lot_id, subscribers in self.topics.items()},
+            "messages": self.messages,
+            "resyncs": self.resyncs,
+            "disconnects": self.disconnects,
+        }
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import os
+from typing import Callable, List
+from prometheus_client import Counter
+from observability import ERRORS
+
+DEFAULT_CHECK_INTERVAL = 1.0  # seconds
+DEFAULT_STALL_TIMEOUT = 15.0  # seconds without a grabbed frame before a stream is restarted
+LAYOUT_SETTLE = 1.0  # seconds a changed layout file must stay unchanged before it is loaded
+
+LAYOUT_RELOADS = Counter("parkease_layout_reloads_total", "Layout file reloads", ["camera", "result"])
+
+logger = logging.getLogger(__name__)
+
+
+def file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+class LayoutWatch:
+    def __init__(self, name, path, load: Callable, apply: Callable):
+        self.name = name
+        self.path = path
+        self.load = load
+        self.apply = apply
+        self.loaded = file_signature(path)
+        self.seen = self.loaded
+        self.seen_at = 0.0
+
+
+class DetectorSupervisor:
+    """Watches a detector's captures and layout files from the event loop.
+
+    A capture with no grabbed frame for `stall_timeout` seconds is restarted,
+    unless it is already reopening its stream with backoff: only a reader
+    stuck inside grab() needs a fresh thread. A layout file
+    whose inode, size or mtime changed is loaded once it has stayed
+    unchanged for LAYOUT_SETTLE seconds, off the loop, and handed to its
+    `apply` callback; a file that fails to load (e.g. still being copied)
+    is retried on its next change and the running layout is kept.
+    """
+
+    def __init__(self, check_interval=DEFAULT_CHECK_INTERVAL, stall_timeout=DEFAULT_STALL_TIMEOUT):
+        self.check_interval = check_interval
+        self.stall_timeout = stall_timeout
+        self.captures = []
+        self.layouts: List[LayoutWatch] = []
+        self._task = None
+
+        self.stalls = 0
+        self.reloads = 0
+        self.reload_failures = 0
+
+    def watch_capture(self, capture):
+        self.captures.append(capture)
+
+    def watch_layout(self, name, path, load: Callable, apply: Callable):
+        # load(path) runs in a worker thread; apply(layout) runs on the loop
+        self.layouts.append(LayoutWatch(name, path, load, apply))
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def check_captures(self):
+        for capture in self.captures:
+            age = capture.frame_age()
+            if age > self.stall_timeout and not capture.reconnecting:
+                self.stalls += 1
+                logger.warning("stream stalled camera=%s frame_age=%.1fs, restarting", capture.name, age)
+                capture.restart("stalled")
+
+    async def check_layouts(self, now):
+        for watch in self.layouts:
+            signature = file_signature(watch.path)
+            if signature is None or signature == watch.loaded:
+                continue
+            if signature != watch.seen:
+                watch.seen, watch.seen_at = signature, now
+                continue
+            if now - watch.seen_at < LAYOUT_SETTLE:
+                continue
+
+            watch.loaded = signature
+            try:
+                layout = await asyncio.to_thread(watch.load, watch.path)
+                watch.apply(layout)
+            except Exception as e:
+                self.reload_failures += 1
+                ERRORS.labels(component="layout_reload").inc()
+                LAYOUT_RELOADS.labels(camera=watch.name, result="failed").inc()
+                logger.warning("layout reload failed camera=%s path=%s error=%s", watch.name, watch.path, e)
+                continue
+            self.reloads += 1
+            LAYOUT_RELOADS.labels(camera=watch.name, result="ok").inc()
+            logger.info("layout reloaded camera=%s path=%s slots=%d", watch.name, watch.path, layout.num_slots)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.check_interval)
+            self.check_captures()
+            await self.check_layouts(loop.time())
+
+    def stats(self):
+        return {
+            "stalls": self.stalls,
+            "reloads": self.reloads,
+            "reload_failures": self.reload_failures,
+            "frame_age_s": {capture.name: round(capture.frame_age(), 2) for capture in self.captures},
+        }
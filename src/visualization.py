@@ -0,0 +1,228 @@
+import logging
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import cvzone
+import numpy as np
+from occupancy import FRAME_WIDTH, FRAME_HEIGHT
+
+OFF = "off"
+FILE = "file"
+MJPEG = "mjpeg"
+
+DEFAULT_FPS = 1.0
+DEFAULT_OUTPUT = "Real_Time_Stream.jpeg"
+DEFAULT_MJPEG_PORT = 8081
+DEFAULT_JPEG_QUALITY = 80
+
+FREE_COLOR = (0, 255, 0)
+FILLED_COLOR = (0, 0, 255)
+
+logger = logging.getLogger(__name__)
+
+
+def outline_labels(labels):
+    # Pixels on either side of a slot's boundary get its index + 1, about as
+    # thick as a 2 px polyline
+    labels = np.asarray(labels)
+    padded = np.pad(labels, 1, constant_values=-1).astype(np.int32)
+    outlines = np.zeros(labels.shape, dtype=np.uint16)
+    height, width = labels.shape
+    for dy, dx in ((0, 1), (2, 1), (1, 0), (1, 2)):
+        neighbour = padded[dy:dy + height, dx:dx + width]
+        edge = neighbour != labels
+        inside = edge & (labels >= 0)
+        outlines[inside] = labels[inside] + 1
+        outside = edge & (labels < 0) & (outlines == 0)
+        outlines[outside] = neighbour[outside] + 1
+    return outlines
+
+
+class SlotOverlay:
+    """Slot outlines, names and the filled/free header, composited onto frames.
+
+    Outlines and names are drawn once (outlines traced from the layout's
+    label mask when given); per state only a palette lookup
+    and the header text are redrawn, and the result is cached until the set
+    of filled slots changes. Compositing touches only the overlay's pixels.
+    """
+
+    def __init__(self, polylines, area_names, frame_size=(FRAME_WIDTH, FRAME_HEIGHT), opacity=1.0, labels=None):
+        width, height = frame_size
+        self.area_names = list(area_names)
+        self.index = {name: i for i, name in enumerate(self.area_names)}
+        self.opacity = opacity
+
+        # Outline pixels labelled with slot index + 1, 0 elsewhere
+        if labels is not None:
+            self.labels = outline_labels(labels)
+        else:
+            self.labels = np.zeros((height, width), dtype=np.uint16)
+            for i, polyline in enumerate(polylines):
+                cv2.polylines(self.labels, [np.asarray(polyline, np.int32)], True, i + 1, 2)
+
+        self.names = np.zeros((height, width, 3), dtype=np.uint8)
+        for name, polyline in zip(self.area_names, polylines):
+            cvzone.putTextRect(self.names, f"{name}", tuple(polyline[0]), 1, 1)
+        self.names_mask = self.names.any(axis=2)
+
+        self._key = None
+        self._pixels = None
+        self._colors = None
+
+    def _build(self, filled_slots):
+        palette = np.zeros((len(self.area_names) + 1, 3), dtype=np.uint8)
+        palette[1:] = FREE_COLOR
+        for name in filled_slots:
+            if name in self.index:
+                palette[self.index[name] + 1] = FILLED_COLOR
+        layer = palette[self.labels]
+        layer[self.names_mask] = self.names[self.names_mask]
+
+        filled_text = f"Filled Slots: [{', '.join(sorted(filled_slots))}]" if filled_slots else "Filled Slots: [None]"
+        cvzone.putTextRect(layer, filled_text, (50, 100), 2, 2, offset=10, colorB=(4, 217, 252))
+        cvzone.putTextRect(layer, f"Free Slots: {len(self.area_names) - len(filled_slots)}", (50, 50), 2, 2,
+                           offset=10, colorB=(4, 217, 252))
+
+        mask = ((self.labels > 0) | layer.any(axis=2)).reshape(-1)
+        self._pixels = np.flatnonzero(mask)
+        self._colors = layer.reshape(-1, 3)[self._pixels].astype(np.float32)
+
+    def render(self, frame, filled_slots):
+        key = frozenset(filled_slots)
+        if key != self._key:
+            self._build(key)
+            self._key = key
+
+        image = frame.copy()
+        flat = image.reshape(-1, 3)
+        if self.opacity >= 1.0:
+            flat[self._pixels] = self._colors
+        else:
+            under = flat[self._pixels].astype(np.float32)
+            flat[self._pixels] = under * (1 - self.opacity) + self._colors * self.opacity
+        return image
+
+
+def write_atomic(path, data):
+    # Readers never see a half-written image: write aside, then rename over
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class MjpegStream:
+    """Serves the latest rendered frame as multipart/x-mixed-replace over HTTP.
+
+    `viewers` counts connected clients so the caller can skip rendering and
+    JPEG encoding entirely while nobody is watching.
+    """
+
+    def __init__(self, host="0.0.0.0", port=DEFAULT_MJPEG_PORT):
+        self.host = host
+        self.port = port
+        self.viewers = 0
+        self._jpeg = None
+        self._seq = 0
+        self._condition = threading.Condition()
+        self._server = None
+
+    def publish(self, jpeg):
+        with self._condition:
+            self._jpeg = jpeg
+            self._seq += 1
+            self._condition.notify_all()
+
+    def _next(self, seen, timeout=5.0):
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq != seen, timeout)
+            return self._seq, self._jpeg
+
+    def start(self):
+        stream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                self.send_header("Cache-Control", "no-cache")
+                self.end_headers()
+                with stream._condition:
+                    stream.viewers += 1
+                seen = -1
+                try:
+                    while True:
+                        seq, jpeg = stream._next(seen)
+                        if seq == seen or jpeg is None:
+                            continue
+                        seen = seq
+                        self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n")
+                        self.wfile.write(f"Content-Length: {len(jpeg)}\r\n\r\n".encode())
+                        self.wfile.write(jpeg + b"\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stream._condition:
+                        stream.viewers -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info("mjpeg stream url=http://%s:%d/", self.host, self.port)
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+class Visualizer:
+    """Optional, rate-limited debug output of the annotated stream.
+
+    `mode` is "off", "file" (atomically replaced JPEG) or "mjpeg" (HTTP
+    stream, rendered only while a viewer is connected). At most `fps`
+    frames per second are rendered.
+    """
+
+    def __init__(self, overlay, mode=FILE, fps=DEFAULT_FPS, path=DEFAULT_OUTPUT, stream=None,
+                 quality=DEFAULT_JPEG_QUALITY):
+        if mode not in (OFF, FILE, MJPEG):
+            raise ValueError(f"Unknown visualization mode: {mode}")
+        if mode == MJPEG and stream is None:
+            raise ValueError("mjpeg visualization needs an MjpegStream")
+        self.overlay = overlay
+        self.mode = mode if fps > 0 else OFF
+        self.period = 1.0 / fps if fps > 0 else float("inf")
+        self.path = path
+        self.stream = stream
+        self.quality = quality
+        self.next_due = 0.0
+        self.rendered = 0
+
+    @property
+    def enabled(self):
+        return self.mode != OFF
+
+    def submit(self, frame, filled_slots, now):
+        if not self.enabled or now < self.next_due:
+            return False
+        self.next_due = now + self.period
+        if self.mode == MJPEG and not self.stream.viewers:
+            return False
+
+        image = self.overlay.render(frame, filled_slots)
+        ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            return False
+        if self.mode == FILE:
+            write_atomic(self.path, jpeg.tobytes())
+        else:
+            self.stream.publish(jpeg.tobytes())
+        self.rendered += 1
+        return True
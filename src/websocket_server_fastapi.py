@@ -1,13 +1,26 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Header, Query
+from fastapi.responses import JSONResponse, Response
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from prisma import Prisma
+from prisma.errors import UniqueViolationError
 from dotenv import load_dotenv
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 import uvicorn
 import asyncio
+import json
+import logging
 import os 
+import time
+from slot_protocol import LotStreams
+from slot_store import SlotDirectory, provision_slots
+from write_behind import WriteBehindBuffer
+from subscriptions import SubscriptionHub
+from availability import AvailabilityView, LONG_POLL_MAX_TIMEOUT
+from history import OccupancyHistory, ROLLUP_BUCKETS
+from observability import ERRORS, FAST_BUCKETS, setup_logging
 
 dotenv_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(dotenv_path)
@@ -16,6 +29,30 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise EnvironmentError("DATABASE_URL environment variable is missing or not set")
 
+## Docker Env:
+load_dotenv("/etc/environment")
+##
+
+# Lot used by detectors that connect without naming one (single-lot deployments)
+DEFAULT_PARKING_LOT_ID = os.getenv("PARKING_LOT_ID")
+# Lot setup runs in one transaction; large lots need more than Prisma's 5 s default
+SETUP_TRANSACTION_TIMEOUT = timedelta(seconds=float(os.getenv("SETUP_TRANSACTION_TIMEOUT", 60)))
+# Most rollup rows one history query returns, and the range queried by default
+HISTORY_QUERY_LIMIT = int(os.getenv("HISTORY_QUERY_LIMIT", 10000))
+DEFAULT_HISTORY_RANGE = {"5m": timedelta(days=1), "1h": timedelta(days=7)}
+
+setup_logging()
+logger = logging.getLogger("server")
+
+SLOT_MESSAGES = Counter("parkease_server_slot_messages_total", "Detector slot messages received", ["lot", "kind"])
+SLOT_CHANGES = Counter("parkease_server_slot_changes_total", "Slots whose state changed", ["lot"])
+RESYNC_REQUESTS = Counter("parkease_server_resync_requests_total", "Resyncs asked of detectors", ["lot"])
+MESSAGE_SECONDS = Histogram("parkease_server_message_seconds", "Handling time per detector message",
+                            buckets=FAST_BUCKETS)
+READ_SECONDS = Histogram("parkease_server_read_seconds", "Server time per occupancy read, excluding long-poll waits",
+                         ["endpoint"], buckets=FAST_BUCKETS)
+CONNECTED_CLIENTS = Gauge("parkease_connected_clients", "Open WebSocket connections", ["kind"])
+
 # Deprecated #
 # Connect to Prisma at the startup
 # @app.on_event("startup")
@@ -27,10 +64,25 @@ if not DATABASE_URL:
 # async def shutdown():
 #     await prisma.disconnect()
 
+# Lot/slot id cache shared by the create endpoints and the status path
+slot_directory = SlotDirectory()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await prisma.connect()
+    await slot_directory.warm(prisma)
+    logger.info("slot directory warmed stats=%s", slot_directory.stats())
+    await availability.warm(prisma)
+    logger.info("availability view warmed stats=%s", availability.stats())
+    # Detector reports are diffed against the stored statuses, not an empty state
+    for lot_id, stored in availability.stored.items():
+        slot_writer.seed(lot_id, stored)
+        occupancy_history.seed(lot_id, stored)
+    slot_writer.start()
+    occupancy_history.start()
     yield
+    await occupancy_history.stop()
+    await slot_writer.stop()
     await prisma.disconnect()
 
 # Dependency to inject Prisma into the route handlers
@@ -40,6 +92,16 @@ async def get_prisma():
 app = FastAPI(lifespan=lifespan)
 prisma = Prisma()
 
+# Slot states are served from memory and persisted in the background
+slot_writer = WriteBehindBuffer(prisma, slot_directory)
+# Slot transitions appended to SlotEvent and rolled up, off the ingest path
+occupancy_history = OccupancyHistory(prisma)
+# Occupancy reads and lot versions, answered from memory without touching Mongo
+availability = AvailabilityView(slot_writer.state)
+# Dashboards subscribe per lot: a snapshot from memory, with the same slot
+# states as /lots/{id}/occupancy, then pushed deltas
+subscription_hub = SubscriptionHub(availability.slot_states, availability.version)
+
 # Request models
 class ParkingLotCreateRequest(BaseModel):
     name: str
@@ -54,6 +116,16 @@ class ParkingSlotCreateRequest(BaseModel):
     locations: List[Dict[str, float]]
 
 
+class ParkingLotSetupRequest(BaseModel):
+    lot_id: Optional[str] = None
+    name: str
+    location: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    slot_numbers: List[int]
+    locations: List[Dict[str, float]]
+
+
 @app.post("/create_parking_lot", status_code=201)
 async def create_parking_lot(data: ParkingLotCreateRequest, prisma: Prisma = Depends(get_prisma)):
     try:
@@ -64,33 +136,83 @@ async def create_parking_lot(data: ParkingLotCreateRequest, prisma: Prisma = Dep
                 "totalSlots": data.total_slots
             }
         )
+        slot_directory.add_lot(parking_lot.id)
+        availability.set_lot(parking_lot.id, data.name, data.location)
         return {"id": parking_lot.id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def register_slots(slots):
+    # Provisioned slots become known to the caches, and their stored status
+    # is what the next detector report is diffed against
+    statuses = {}
+    for slot in slots:
+        slot_directory.add(slot.lotId, slot.slotNumber, slot.id)
+        availability.add_slot(slot.lotId, slot.slotNumber, slot.locationX, slot.locationY, slot.status)
+        if slot.status is not None:
+            statuses.setdefault(slot.lotId, {})[str(slot.slotNumber)] = slot.status
+    for lot_id, lot_slots in statuses.items():
+        slot_writer.seed(lot_id, lot_slots)
+        occupancy_history.seed(lot_id, lot_slots)
+
+
 @app.post("/create_parking_slots", status_code=200)
 async def create_parking_slots(data: ParkingSlotCreateRequest, prisma: Prisma = Depends(get_prisma)):
     if len(data.slot_numbers) != len(data.locations) or len(data.slot_numbers) != data.num_parking_slots:
         raise HTTPException(status_code=400, detail="Mismatch between num_parking_slots, slot_numbers, and locations")
 
     try:
-        slots = []
-        for slot_number, location in zip(data.slot_numbers, data.locations):
-            slot = await prisma.parkingslot.create(
-                data={
-                    "slotNumber": int(slot_number),
-                    "locationX": location["lat"],
-                    "locationY": location["long"],
-                    "lotId": data.parking_lot_id,
-                    "status": True
-                }
-            )
-            slots.append(slot)
-        return {"slots": [slot.dict() for slot in slots]}
+        # Bulk and idempotent: slots that already exist are not created again
+        result = await provision_slots(prisma, data.parking_lot_id, dict(zip(data.slot_numbers, data.locations)))
+        register_slots(result["slots"])
+        return {"slots": [slot.dict() for slot in result["slots"]]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/setup_parking_lot", status_code=200)
+async def setup_parking_lot(data: ParkingLotSetupRequest, prisma: Prisma = Depends(get_prisma)):
+    # Lot and slots in one transaction. Safe to repeat: with lot_id the
+    # existing lot is reused and only missing or moved slots are written.
+    if len(data.slot_numbers) != len(data.locations):
+        raise HTTPException(status_code=400, detail="Mismatch between slot_numbers and locations")
+
+    try:
+        async with prisma.tx(timeout=SETUP_TRANSACTION_TIMEOUT) as tx:
+            lot = None
+            if data.lot_id:
+                lot = await tx.parkinglot.find_unique(where={"id": data.lot_id})
+                if lot is None:
+                    raise HTTPException(status_code=404, detail=f"Parking lot {data.lot_id} not found")
+            lot_created = lot is None
+            if lot_created:
+                lot_data = {"name": data.name, "location": data.location, "totalSlots": len(data.slot_numbers)}
+                if data.latitude is not None and data.longitude is not None:
+                    lot_data.update(latitude=data.latitude, longitude=data.longitude)
+                lot = await tx.parkinglot.create(data=lot_data)
+            result = await provision_slots(tx, lot.id, dict(zip(data.slot_numbers, data.locations)), in_transaction=True)
+            if not lot_created and lot.totalSlots != len(result["slots"]):
+                await tx.parkinglot.update(where={"id": lot.id}, data={"totalSlots": len(result["slots"])})
+    except HTTPException:
+        raise
+    except UniqueViolationError:
+        # The transaction was rolled back; the call is idempotent, so a retry settles it
+        raise HTTPException(status_code=409, detail="A concurrent setup created some of these slots, retry the call")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    slot_directory.add_lot(lot.id)
+    availability.set_lot(lot.id, lot.name, lot.location, data.latitude, data.longitude)
+    register_slots(result["slots"])
+    return {
+        "id": lot.id,
+        "lot_created": lot_created,
+        "created": result["created"],
+        "updated": result["updated"],
+        "unchanged": result["unchanged"],
+    }
+
 
 # WebSocket handling
 class ConnectionManager:
@@ -105,12 +227,49 @@ class ConnectionManager:
         self.active_connections.remove(websocket)
 
     async def broadcast(self, message: Dict[str, Any]):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        # Serialize once and send concurrently; dead sockets are dropped
+        text = json.dumps(message)
+        connections = list(self.active_connections)
+        results = await asyncio.gather(
+            *(connection.send_text(text) for connection in connections), return_exceptions=True
+        )
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception) and connection in self.active_connections:
+                self.active_connections.remove(connection)
 
 
 manager = ConnectionManager()
 
+# Sequence state per lot, so it survives detector reconnects
+slot_streams: Dict[str, LotStreams] = {}
+
+CONNECTED_CLIENTS.labels(kind="detector").set_function(lambda: sum(s.connected() for s in slot_streams.values()))
+CONNECTED_CLIENTS.labels(kind="subscriber").set_function(subscription_hub.subscriber_count)
+CONNECTED_CLIENTS.labels(kind="broadcast").set_function(lambda: len(manager.active_connections))
+
+
+@app.get("/metrics")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/slot_cache")
+async def slot_cache_stats():
+    return slot_directory.stats()
+
+
+@app.get("/slot_writer")
+async def slot_writer_stats():
+    return slot_writer.stats()
+
+
+@app.post("/slot_cache/invalidate")
+async def invalidate_slot_cache(lot_id: str = None, prisma: Prisma = Depends(get_prisma)):
+    slot_directory.invalidate(lot_id)
+    if lot_id is None:
+        await slot_directory.warm(prisma)
+    return slot_directory.stats()
+
 
 @app.websocket("/connect")
 async def websocket_connect(websocket: WebSocket):
@@ -123,61 +282,188 @@ async def websocket_connect(websocket: WebSocket):
         manager.disconnect(websocket)
 
 
-@app.websocket("/update_slot_status")
-async def update_slot_status(websocket: WebSocket, prisma: Prisma = Depends(get_prisma)):
-    await manager.connect(websocket)
-
-    ## Docker Env:
-    load_dotenv("/etc/environment")
-    ##
-
-    PARKING_LOT_ID = os.getenv("PARKING_LOT_ID")
-    if not PARKING_LOT_ID:
-        raise EnvironmentError("PARKING_LOT_ID environment variable is missing or not set")
-    
-    print("PARKING_LOT_ID:",PARKING_LOT_ID)
-    
+async def receive_slot_updates(websocket: WebSocket, lot_id: str = None):
+    await websocket.accept()
     try:
-        while True:
-            # Receive data from the client
-            data = await websocket.receive_json()
-            filled_slots = data.get("filled_slots", [])
-            free_slots = data.get("free_slots", [])
-            timestamp = data.get("timestamp")
-
-            # Logging information
-            print(f"Filled Slot Numbers: {filled_slots}")
-            print(f"Free Slot Numbers: {free_slots}")
-            print(f"Timestamp: {timestamp}")
-
-            # Use asyncio.gather to batch the updates for efficiency
-            async def update_slot_status(slot_number: str, status: bool):
-                slot = await prisma.parkingslot.find_first(
-                    where={"lotId": PARKING_LOT_ID, "slotNumber": int(slot_number)}
-                )
-                if slot:
-                    await prisma.parkingslot.update(
-                        where={"id": slot.id},
-                        data={"status": status}
-                    )
-
-            # Run updates concurrently for filled and free slots
-            tasks = []
-            for slot_num in filled_slots:
-                tasks.append(update_slot_status(slot_num, False))
-            for slot_num in free_slots:
-                tasks.append(update_slot_status(slot_num, True))
-            
-            # Wait for all updates to complete
-            await asyncio.gather(*tasks)
-
-            print("Slot statuses updated successfully!")
+        # Without a lot in the path, the first message may name it: {"type": "hello", "lot_id": ...}
+        data = await websocket.receive_json()
+        if data.get("type") == "hello":
+            lot_id = data.get("lot_id") or lot_id
+            data = None
+        lot_id = lot_id or DEFAULT_PARKING_LOT_ID
+        if not lot_id:
+            await websocket.close(code=1008, reason="No parking lot id in path, hello message or PARKING_LOT_ID")
+            return
+
+        streams = slot_streams.setdefault(lot_id, LotStreams())
+        session, decoder = None, None
+        logger.info("detector connected lot=%s", lot_id)
+
+        try:
+            while True:
+                if data is None:
+                    data = await websocket.receive_json()
+                start = time.perf_counter()
+                # Each detector session on the lot has its own sequence
+                if decoder is None or data.get("session") != session:
+                    if decoder is not None:
+                        streams.detach(session)
+                    session = data.get("session")
+                    decoder = streams.attach(session)
+                kind, slots = decoder.accept(data)
+                SLOT_MESSAGES.labels(lot=lot_id, kind=kind or "duplicate").inc()
+
+                if kind is not None:
+                    # Stage in memory; the write-behind flusher persists the net changes
+                    changed = slot_writer.stage(lot_id, slots)
+                    availability.commit(lot_id, changed)
+                    occupancy_history.record(lot_id, changed, data.get("timestamp"))
+                    subscription_hub.publish(lot_id, changed)
+                    SLOT_CHANGES.labels(lot=lot_id).inc(len(changed))
+
+                if "seq" in data:
+                    await websocket.send_json({"type": "ack", "seq": data["seq"]})
+                if decoder.needs_resync:
+                    RESYNC_REQUESTS.labels(lot=lot_id).inc()
+                    logger.debug("resync requested lot=%s last_seq=%s", lot_id, decoder.last_seq)
+                    await websocket.send_json({"type": "resync", "last_seq": decoder.last_seq})
+                MESSAGE_SECONDS.observe(time.perf_counter() - start)
+                data = None
+        finally:
+            if decoder is not None:
+                streams.detach(session)
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
     except Exception as e:
+        ERRORS.labels(component="slot_updates").inc()
+        logger.warning("slot update failed lot=%s error=%s", lot_id, e)
         await websocket.send_json({"error": str(e)})
 
+
+@app.websocket("/update_slot_status")
+async def update_slot_status(websocket: WebSocket):
+    await receive_slot_updates(websocket)
+
+
+@app.websocket("/update_slot_status/{lot_id}")
+async def update_lot_slot_status(websocket: WebSocket, lot_id: str):
+    await receive_slot_updates(websocket, lot_id)
+
+
+@app.websocket("/subscribe/{lot_id}")
+async def subscribe_lot(websocket: WebSocket, lot_id: str):
+    await subscription_hub.serve(websocket, lot_id)
+
+
+@app.get("/subscriptions")
+async def subscription_stats():
+    return subscription_hub.stats()
+
+
+@app.get("/lots/nearby")
+async def lots_nearby(lat: float, long: float, radius_km: float = 5.0,
+                      limit: int = Query(20, ge=1, le=500), min_free: int = 0):
+    start = time.perf_counter()
+    lots = availability.nearby(lat, long, radius_km, limit, min_free)
+    READ_SECONDS.labels(endpoint="nearby").observe(time.perf_counter() - start)
+    return {"lots": lots}
+
+
+@app.get("/lots/{lot_id}/occupancy")
+async def lot_occupancy(lot_id: str, slots: bool = True, since: Optional[int] = None,
+                        timeout: float = Query(LONG_POLL_MAX_TIMEOUT, ge=0),
+                        if_none_match: Optional[str] = Header(None)):
+    # Conditional with If-None-Match; with ?since=N the request is held until
+    # the lot's version is past N or the timeout ends (then 304)
+    if not availability.known(lot_id):
+        raise HTTPException(status_code=404, detail=f"Parking lot {lot_id} not found")
+    if since is not None and not await availability.wait(lot_id, since, timeout):
+        return Response(status_code=304, headers={"ETag": availability.etag(lot_id)})
+
+    start = time.perf_counter()
+    etag, body = availability.body(lot_id, slots)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        response = Response(status_code=304, headers=headers)
+    else:
+        response = Response(body, media_type="application/json", headers=headers)
+    READ_SECONDS.labels(endpoint="occupancy").observe(time.perf_counter() - start)
+    return response
+
+
+async def read_rollups(table, where: Dict[str, Any], bucket: str, start: Optional[datetime], end: Optional[datetime]):
+    if bucket not in ROLLUP_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {list(ROLLUP_BUCKETS)}")
+    end = end or datetime.now(timezone.utc)
+    start = start or end - DEFAULT_HISTORY_RANGE.get(bucket, timedelta(days=7))
+    rows = await table.find_many(
+        where=dict(where, bucket=bucket, start={"gte": start, "lt": end}),
+        order={"start": "asc"},
+        take=HISTORY_QUERY_LIMIT,
+    )
+    size = ROLLUP_BUCKETS[bucket]
+    return {
+        "bucket": bucket,
+        "start": start,
+        "end": end,
+        "truncated": len(rows) == HISTORY_QUERY_LIMIT,
+        "buckets": [
+            {
+                "start": row.start,
+                # Share of observed time occupied, and the mean number of occupied slots
+                "occupancy": round(row.occupiedSeconds / row.observedSeconds, 4) if row.observedSeconds else None,
+                "occupied_slots": round(row.occupiedSeconds / size, 3),
+                "occupied_seconds": row.occupiedSeconds,
+                "observed_seconds": row.observedSeconds,
+                "transitions": row.transitions,
+            }
+            for row in rows
+        ],
+    }
+
+
+@app.get("/lots/{lot_id}/history")
+async def lot_history(lot_id: str, bucket: str = "1h", start: Optional[datetime] = None,
+                      end: Optional[datetime] = None, prisma: Prisma = Depends(get_prisma)):
+    return await read_rollups(prisma.lotoccupancyrollup, {"lotId": lot_id}, bucket, start, end)
+
+
+@app.get("/lots/{lot_id}/slots/{slot_number}/history")
+async def slot_history(lot_id: str, slot_number: int, bucket: str = "1h", start: Optional[datetime] = None,
+                       end: Optional[datetime] = None, prisma: Prisma = Depends(get_prisma)):
+    return await read_rollups(prisma.slotoccupancyrollup, {"lotId": lot_id, "slotNumber": slot_number},
+                              bucket, start, end)
+
+
+@app.get("/history")
+async def history_stats():
+    return occupancy_history.stats()
+
+
+@app.get("/availability")
+async def availability_stats():
+    return availability.stats()
+
+
+@app.get("/detectors")
+async def connected_detectors():
+    return {
+        lot_id: {
+            "connections": streams.connected(),
+            "sessions": {
+                session or "legacy": {
+                    "connections": streams.connections.get(session, 0),
+                    "last_seq": decoder.last_seq,
+                    "gaps": decoder.gaps,
+                    "duplicates": decoder.duplicates,
+                }
+                for session, decoder in streams.decoders.items()
+            },
+        }
+        for lot_id, streams in slot_streams.items()
+    }
+
 if __name__=="__main__":
     uvicorn.run(app,host="127.0.0.1",port=5000)
 
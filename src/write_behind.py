@@ -0,0 +1,157 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict
+from prometheus_client import Counter, Histogram
+from slot_store import SlotDirectory, write_slot_statuses
+from observability import ERRORS, SLOW_BUCKETS
+
+WRITE_BEHIND_INTERVAL = float(os.getenv("WRITE_BEHIND_INTERVAL", 1.0))  # seconds
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", 500))  # slots
+
+# With write-behind a DB write covers every message for a lot since the last flush
+DB_WRITE_SECONDS = Histogram("parkease_db_write_seconds", "Slot status write time per lot per flush",
+                             buckets=SLOW_BUCKETS)
+SLOTS_WRITTEN = Counter("parkease_db_slots_written_total", "Slot statuses persisted")
+SLOTS_COLLAPSED = Counter("parkease_db_slots_collapsed_total", "Staged slot changes that needed no write")
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """Holds the latest slot states in memory and persists only net changes.
+
+    The status handler stages states and returns immediately; a background
+    flusher writes pending changes every `interval` seconds, or sooner once
+    `max_pending` slots are waiting. A slot that flips and flips back before
+    a flush produces no write at all.
+    """
+
+    def __init__(self, prisma, directory: SlotDirectory = None,
+                 interval=WRITE_BEHIND_INTERVAL, max_pending=WRITE_BEHIND_MAX_PENDING):
+        self.prisma = prisma
+        self.directory = directory
+        self.interval = interval
+        self.max_pending = max_pending
+
+        self.latest: Dict[str, Dict[str, bool]] = {}
+        self.persisted: Dict[str, Dict[str, bool]] = {}
+        self.pending: Dict[str, Dict[str, bool]] = {}
+        self._pending_count = 0
+        self._flush_now = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+        self.flushes = 0
+        self.written = 0
+        self.collapsed = 0
+        self.errors = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            # Let an in-flight flush finish: its batch is no longer pending
+            self._stopping = True
+            self._flush_now.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def seed(self, lot_id: str, slots: Dict[str, bool]):
+        # Stored statuses, so the first report after a start is diffed against
+        # the DB; slots already staged keep their state
+        latest = self.latest.setdefault(lot_id, {})
+        persisted = self.persisted.setdefault(lot_id, {})
+        for slot_number, status in slots.items():
+            latest.setdefault(str(slot_number), bool(status))
+            persisted.setdefault(str(slot_number), bool(status))
+
+    def state(self, lot_id: str) -> Dict[str, bool]:
+        return self.latest.get(lot_id, {})
+
+    def stage(self, lot_id: str, slots: Dict[str, bool]) -> Dict[str, bool]:
+        # Returns the slots whose in-memory state actually changed
+        latest = self.latest.setdefault(lot_id, {})
+        persisted = self.persisted.get(lot_id, {})
+        pending = self.pending.setdefault(lot_id, {})
+        changed = {}
+
+        for slot_number, status in slots.items():
+            if latest.get(slot_number) != status:
+                changed[slot_number] = status
+            latest[slot_number] = status
+            if persisted.get(slot_number) == status:
+                # Flipped back to what is already stored: nothing to write
+                if pending.pop(slot_number, None) is not None:
+                    self._pending_count -= 1
+                    self.collapsed += 1
+                    SLOTS_COLLAPSED.inc()
+            else:
+                if slot_number in pending:
+                    self.collapsed += 1
+                    SLOTS_COLLAPSED.inc()
+                else:
+                    self._pending_count += 1
+                pending[slot_number] = status
+
+        if self._pending_count >= self.max_pending:
+            self._flush_now.set()
+        return changed
+
+    async def flush(self):
+        if not self._pending_count:
+            return
+        batch, self.pending, self._pending_count = self.pending, {}, 0
+        for lot_id, slots in batch.items():
+            if not slots:
+                continue
+            try:
+                start = time.perf_counter()
+                await write_slot_statuses(self.prisma, lot_id, slots, self.directory)
+                DB_WRITE_SECONDS.observe(time.perf_counter() - start)
+                self.persisted.setdefault(lot_id, {}).update(slots)
+                self.written += len(slots)
+                SLOTS_WRITTEN.inc(len(slots))
+                # Slots that flipped back during the write were compared with
+                # the old persisted state and need writing again
+                self._requeue(lot_id, slots)
+            except Exception as e:
+                self.errors += 1
+                ERRORS.labels(component="write_behind").inc()
+                logger.warning("write-behind flush failed lot=%s slots=%d error=%s", lot_id, len(slots), e)
+                self._requeue(lot_id, slots)
+        self.flushes += 1
+
+    def _requeue(self, lot_id: str, slots: Dict[str, bool]):
+        # Stage the latest state of slots the DB may not hold, leaving slots
+        # staged since the swap alone
+        latest = self.latest.get(lot_id, {})
+        persisted = self.persisted.get(lot_id, {})
+        pending = self.pending.setdefault(lot_id, {})
+        for slot_number in slots:
+            status = latest[slot_number]
+            if slot_number not in pending and persisted.get(slot_number) != status:
+                pending[slot_number] = status
+                self._pending_count += 1
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def stats(self):
+        return {
+            "pending": self._pending_count,
+            "flushes": self.flushes,
+            "written": self.written,
+            "collapsed": self.collapsed,
+            "errors": self.errors,
+        }